@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark bin/load-data.py and bin/render.py on synthetic data.
+
+Generates the organisation, award, adoption, quality and other inputs at
+multiples of today's size, entirely offline, then times the load, the
+render and each render section, and records the peak memory of each.
+The local planning authority maps stay the same size, as the geography
+doesn't grow with the programme.
+
+Results are appended to a JSON lines file, with the commit they were
+run against, and compared with the last result at the same scale.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+BIN_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BIN_DIR)
+RESULTS_PATH = "var/benchmark-results.jsonl"
+
+LPA_COUNT = 310
+FUND_COUNT = 20
+
+# Rows in each input at a scale of 1, roughly today's data
+base_counts = {
+    "organisation": 1800,
+    "award": 600,
+    "adoption": 100,
+    "quality": 200,
+    "project-organisation": 150,
+}
+
+interventions = {
+    "engagement": "open-digital-planning",
+    "innovation": "open-digital-planning",
+    "software": "open-digital-planning",
+    "integration": "open-digital-planning",
+    "improvement": "open-digital-planning",
+    "plan-making": "planning-reform",
+    "local-plan-pathfinders": "planning-reform",
+    "local-plan-delivery": "planning-reform",
+    "green-belt-reviews": "",
+}
+
+quality_values = [
+    "0. no data",
+    "1. some data",
+    "2. authoritative data from the LPA",
+    "3. data that is good for ODP",
+    "4. data that is trustworthy",
+]
+
+quality_datasets = [
+    "article-4-direction",
+    "article-4-direction-area",
+    "conservation-area",
+    "conservation-area-document",
+    "listed-building-outline",
+    "tree",
+    "tree-preservation-order",
+    "tree-preservation-zone",
+]
+
+
+def write_csv(path, fieldnames, rows):
+    """Write rows of values to a CSV file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
+        writer.writerows(rows)
+
+
+def random_date(rng, start_year=2019):
+    return f"{rng.randint(start_year, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+
+def generate_maps(rng, lpas):
+    """Generate point and shape SVGs with an area for each LPA."""
+    header = '<svg xmlns="http://www.w3.org/2000/svg" baseProfile="full" viewBox="0 0 455.72 549.055">\n'
+    shapes = [
+        header,
+        "  <defs>\n    <style>\n      .polygon,path{fill:none;stroke:#000}\n    </style>\n  </defs>\n",
+        '  <g transform="matrix(1 0 0 -1 357.28 3760.507)">\n',
+        '    <g id="local-planning-authority" class="name reference">\n',
+    ]
+    points = [
+        header,
+        '  <g transform="matrix(1 0 0 -1 357.28 3760.507)">\n',
+        '    <g id="point" class="name reference">\n',
+    ]
+    for lpa in lpas:
+        x, y = rng.uniform(-250, 90), rng.uniform(3250, 3750)
+        steps = " ".join(
+            f"{rng.uniform(-2, 2):.3f} {rng.uniform(-2, 2):.3f}" for _ in range(400)
+        )
+        shapes.append(
+            f'      <path id="{lpa}" d="m{x:.3f} {y:.3f} {steps}z" '
+            'class="polygon local-planning-authority" fill-rule="evenodd"/>\n'
+        )
+        points.append(
+            f'      <circle id="{lpa}" cx="{x:.3f}" cy="{y:.3f}" r="1" class="point"/>\n'
+        )
+    shapes.append("    </g>\n  </g>\n</svg>\n")
+    points.append("    </g>\n  </g>\n</svg>\n")
+
+    with open("var/cache/local-planning-authority.svg", "w") as f:
+        f.write("".join(shapes))
+    with open("var/cache/point.svg", "w") as f:
+        f.write("".join(points))
+
+
+def generate(scale, seed=0):
+    """Generate synthetic inputs in the current directory, at a multiple of today's size."""
+    rng = random.Random(seed)
+    counts = {name: count * scale for name, count in base_counts.items()}
+
+    lpas = [f"E6{n:07d}" for n in range(1, LPA_COUNT + 1)]
+    organisations = [f"local-authority:L{n:05d}" for n in range(LPA_COUNT)]
+    organisations += [
+        f"government-organisation:G{n:06d}"
+        for n in range(max(0, counts["organisation"] - LPA_COUNT))
+    ]
+
+    write_csv(
+        "var/cache/organisation.csv",
+        [
+            "entity",
+            "name",
+            "organisation",
+            "end-date",
+            "local-planning-authority",
+            "statistical-geography",
+        ],
+        [
+            (
+                100000 + n,
+                f"Organisation {n}",
+                organisation,
+                "2023-04-01" if n % 37 == 5 else "",
+                lpas[n] if n < LPA_COUNT else "",
+                f"E0{n:07d}",
+            )
+            for n, organisation in enumerate(organisations)
+        ],
+    )
+    write_csv(
+        "var/cache/local-planning-authority.csv",
+        ["reference", "name"],
+        [(lpa, f"Area {n} LPA") for n, lpa in enumerate(lpas)],
+    )
+    write_csv(
+        "specification/role-organisation.csv",
+        ["role", "organisation"],
+        [
+            ("local-planning-authority", organisation)
+            for organisation in organisations[:LPA_COUNT]
+        ],
+    )
+    write_csv(
+        "specification/intervention.csv",
+        ["intervention", "name", "description", "project"],
+        [(i, i.replace("-", " ").title(), "", p) for i, p in interventions.items()],
+    )
+
+    funds = [f"fund-{n}" for n in range(FUND_COUNT)]
+    write_csv(
+        "specification/fund.csv",
+        ["fund", "name", "description", "start-date", "documentation-url"],
+        [(fund, f"Fund {n}", "", random_date(rng), "") for n, fund in enumerate(funds)],
+    )
+
+    # awards mostly go to local planning authorities
+    def awardee():
+        if rng.random() < 0.7:
+            return rng.choice(organisations[:LPA_COUNT])
+        return rng.choice(organisations)
+
+    write_csv(
+        "specification/award.csv",
+        [
+            "award",
+            "start-date",
+            "end-date",
+            "organisation",
+            "intervention",
+            "fund",
+            "amount",
+            "organisations",
+            "notes",
+        ],
+        [
+            (
+                f"award-{n}",
+                random_date(rng),
+                "",
+                awardee(),
+                rng.choice(list(interventions)),
+                rng.choice(funds),
+                rng.choice([25000, 100000, 250000, 350000, 1000000]),
+                ";".join(awardee() for _ in range(rng.choice([0, 0, 0, 1, 2, 3]))),
+                "",
+            )
+            for n in range(counts["award"])
+        ],
+    )
+    write_csv(
+        "specification/project-organisation.csv",
+        ["project", "organisation", "start-date", "end-date"],
+        [
+            (
+                rng.choice(
+                    [
+                        "localgov-drupal",
+                        "local-land-charges",
+                        "open-digital-planning",
+                        "digital-planning",
+                    ]
+                ),
+                awardee(),
+                random_date(rng),
+                "2023-01-01" if n % 10 == 0 else "",
+            )
+            for n in range(counts["project-organisation"])
+        ],
+    )
+    write_csv(
+        "data/adoption.csv",
+        [
+            "start-date",
+            "organisation",
+            "product",
+            "adoption-status",
+            "documentation-url",
+        ],
+        [
+            (
+                random_date(rng, 2022),
+                awardee(),
+                rng.choice(["planx", "bops", "dsn/dpr"]),
+                rng.choice(["interested", "adopting", "live"]),
+                "",
+            )
+            for n in range(counts["adoption"])
+        ],
+    )
+    write_csv(
+        "data/quality.csv",
+        ["cohort", "organisation", "organisation_name"]
+        + quality_datasets
+        + ["ready_for_ODP_adoption"],
+        [
+            ["ODP", organisation, ""]
+            + [rng.choice(quality_values) for dataset in quality_datasets]
+            + [rng.choice(["yes", "no"])]
+            for organisation in rng.sample(
+                organisations, min(counts["quality"], len(organisations))
+            )
+        ],
+    )
+    write_csv(
+        "data/p153.csv",
+        ["organisation", "reference", "name", "volume", "percentage"],
+        [
+            (
+                organisation,
+                f"E0{n:07d}",
+                f"Organisation {n}",
+                rng.randint(10, 2000),
+                round(rng.uniform(50, 100), 1),
+            )
+            for n, organisation in enumerate(organisations[:LPA_COUNT])
+        ],
+    )
+    generate_maps(rng, lpas)
+
+    return {name: count for name, count in counts.items()}
+
+
+def run(args):
+    """Run a script, returning its wall time in seconds and peak memory in KB."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable] + args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    stderr = process.stderr.read()
+    pid, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        sys.stderr.write(stderr.decode(errors="replace")[-4000:])
+        raise subprocess.CalledProcessError(process.returncode, args)
+    return round(elapsed, 3), usage.ru_maxrss
+
+
+def benchmark(scale, render_flags):
+    """Generate inputs at a scale, and time loading and rendering them."""
+    result = {"scale": scale}
+
+    print(f"Generating inputs at {scale}x...", file=sys.stderr)
+    result["rows"] = generate(scale)
+
+    print(f"Loading at {scale}x...", file=sys.stderr)
+    wall, max_rss = run([os.path.join(BIN_DIR, "load-data.py")])
+    result["load"] = {"wall": wall, "max_rss": max_rss}
+
+    print(f"Rendering at {scale}x...", file=sys.stderr)
+    wall, max_rss = run(
+        [os.path.join(BIN_DIR, "render.py"), "--force", "--profile", "profile.json"]
+        + render_flags
+    )
+    with open("profile.json") as f:
+        profile = json.load(f)
+    result["render"] = {
+        "wall": wall,
+        "max_rss": max_rss,
+        "pages": len(profile["pages"]),
+        "bytes": sum(page["bytes"] for page in profile["pages"].values()),
+        "sections": {
+            name: round(metrics["wall"], 3)
+            for name, metrics in sorted(profile["functions"].items())
+        },
+    }
+    return result
+
+
+def commit():
+    """Get the commit being benchmarked, marked if there are local changes."""
+    try:
+        head = subprocess.run(
+            ["git", "-C", REPO_DIR, "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "-C", REPO_DIR, "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return head + ("-dirty" if status else "")
+
+
+def load_results(path):
+    """Load the results of previous benchmarks."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def report(result, previous):
+    """Print a result, with the change from the previous result at the same scale."""
+
+    def change(value, before):
+        if not before:
+            return ""
+        return f" ({(value - before) / before:+.0%} on {previous['commit']})"
+
+    before = previous or {"load": {}, "render": {"sections": {}}}
+    load, render = result["load"], result["render"]
+    print(f"\n{result['scale']}x, {render['pages']} pages", file=sys.stderr)
+    print(
+        f"  load   {load['wall']:9.3f}s{change(load['wall'], before['load'].get('wall'))}",
+        file=sys.stderr,
+    )
+    print(
+        f"         {load['max_rss'] // 1024:8d}MB{change(load['max_rss'], before['load'].get('max_rss'))}",
+        file=sys.stderr,
+    )
+    print(
+        f"  render {render['wall']:9.3f}s{change(render['wall'], before['render'].get('wall'))}",
+        file=sys.stderr,
+    )
+    print(
+        f"         {render['max_rss'] // 1024:8d}MB{change(render['max_rss'], before['render'].get('max_rss'))}",
+        file=sys.stderr,
+    )
+    for name, wall in sorted(render["sections"].items(), key=lambda item: -item[1]):
+        print(
+            f"    {wall:9.3f}s {name}{change(wall, before['render']['sections'].get(name))}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--scale",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100],
+        help="multiples of today's data to benchmark (default 1 10 100)",
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join(REPO_DIR, RESULTS_PATH),
+        help=f"JSON lines file to append results to (default {RESULTS_PATH})",
+    )
+    parser.add_argument(
+        "--render-flags",
+        default="",
+        help="options for bin/render.py, such as --shared-maps",
+    )
+    parser.add_argument(
+        "--keep",
+        metavar="DIR",
+        help="generate and render in this directory, and keep it",
+    )
+    args = parser.parse_args()
+
+    results = load_results(args.output)
+    revision = commit()
+    cwd = os.getcwd()
+
+    for scale in args.scale:
+        with tempfile.TemporaryDirectory() as tmp:
+            work = os.path.join(args.keep, f"{scale}x") if args.keep else tmp
+            os.makedirs(work, exist_ok=True)
+            if not os.path.exists(os.path.join(work, "templates")):
+                os.symlink(
+                    os.path.join(REPO_DIR, "templates"), os.path.join(work, "templates")
+                )
+            os.chdir(work)
+            try:
+                result = benchmark(scale, args.render_flags.split())
+            finally:
+                os.chdir(cwd)
+
+        result = {
+            "commit": revision,
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **result,
+        }
+        previous = next(
+            (
+                r
+                for r in reversed(results)
+                if r["scale"] == scale and r["commit"] != revision
+            ),
+            None,
+        )
+        report(result, previous)
+
+        results.append(result)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "a") as f:
+            f.write(json.dumps(result, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+"""
+Check the query plan of every SQL query in bin/render.py.
+
+Fails if a query which takes parameters, and so is run for each page,
+or a nested loop of any query, does a full scan of a large table.
+"""
+
+import os
+import sys
+import ast
+import sqlite3
+import argparse
+
+DATABASE_PATH = "dataset/performance.sqlite3"
+RENDER_PATH = os.path.join(os.path.dirname(__file__), "render.py")
+
+# Scans which are expected, by render function, table and query filter
+expected_scans = {
+    # every funded organisation is listed on each product page
+    ("render_products", "organisations", "o.amount > 0"),
+    # a project can include most organisations
+    ("render_projects", "organisations", "po.project = ?"),
+    ("process_points_svg", "awards", "po.project = ?"),
+}
+
+
+def find_queries(path):
+    """Find the SQL queries in a Python module, with their enclosing function."""
+    tree = ast.parse(open(path).read(), path)
+    queries = []
+
+    def visit(node, function):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            function = node.name
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            sql = node.value.strip()
+            if sql.startswith("SELECT"):
+                queries.append((function, node.lineno, sql))
+        for child in ast.iter_child_nodes(node):
+            visit(child, function)
+
+    visit(tree, "")
+    return queries
+
+
+def table_sizes(conn):
+    """Count the rows in each table."""
+    sizes = {}
+    for (table,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall():
+        sizes[table] = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+    return sizes
+
+
+def query_plan(conn, sql):
+    """Get the query plan for a query, with any parameters left unbound."""
+    params = [None] * sql.count("?")
+    return conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+
+
+def plan_scans(plan, aliases):
+    """Find the tables fully scanned by a query plan.
+
+    Returns a list of (table, nested) tuples, where nested is true
+    when the scan isn't the outermost loop of its query.
+    """
+    scans = []
+    loops = {}
+    for id, parent, notused, detail in plan:
+        words = detail.split()
+        if words[0] not in ("SCAN", "SEARCH"):
+            continue
+        nested = parent in loops
+        loops[parent] = True
+        if words[0] == "SCAN" and len(words) > 1:
+            scans.append((aliases.get(words[1], words[1]), nested))
+    return scans
+
+
+def table_aliases(sql, tables):
+    """Map the aliases used in a query to their table names."""
+    aliases = {}
+    words = sql.replace(",", " ").replace("(", " ").split()
+    for i, word in enumerate(words[:-1]):
+        if word in tables:
+            following = words[i + 1]
+            if following.upper() == "AS" and i + 2 < len(words):
+                following = words[i + 2]
+            aliases[following] = word
+    return aliases
+
+
+def check(conn, queries, min_rows):
+    """Check each query's plan, returning a list of problems found."""
+    sizes = table_sizes(conn)
+    problems = []
+
+    for function, lineno, sql in queries:
+        aliases = table_aliases(sql, sizes)
+        plan = query_plan(conn, sql)
+        for table, nested in plan_scans(plan, aliases):
+            if sizes.get(table, 0) < min_rows:
+                continue
+            if any(
+                (function, table) == (f, t) and text in sql
+                for f, t, text in expected_scans
+            ):
+                continue
+            if nested or "?" in sql:
+                problems.append(
+                    f"{RENDER_PATH}:{lineno} {function}: full scan of {table} ({sizes[table]} rows)\n"
+                    + "\n".join(f"    {row[3]}" for row in plan)
+                )
+
+    return problems
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--min-rows",
+        type=int,
+        default=100,
+        help="the number of rows from which a table counts as large",
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(DATABASE_PATH):
+        print(f"Error: Database not found at {DATABASE_PATH}", file=sys.stderr)
+        print("Please run 'make dataset/performance.sqlite3' first", file=sys.stderr)
+        sys.exit(1)
+
+    conn = sqlite3.connect(DATABASE_PATH)
+    queries = find_queries(RENDER_PATH)
+    try:
+        problems = check(conn, queries, args.min_rows)
+    finally:
+        conn.close()
+
+    for problem in problems:
+        print(problem, file=sys.stderr)
+
+    print(
+        f"Checked {len(queries)} queries, found {len(problems)} full table scans",
+        file=sys.stderr,
+    )
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""
+Extract the live planning application statistics tables as a long CSV of
+organisation, table, period, measure and value, one sheet at a time.
+
+usage: extract-statistics.py statistics.csv
+"""
+
+import os
+import re
+import calendar
+import sys
+import pandas as pd
+
+from spreadsheet import read_sheets, read_table, organisation_references
+
+# https://www.gov.uk/government/statistical-data-sets/live-tables-on-planning-application-statistics
+#
+# The layout of each table: the rows to skip before the heading and after
+# the data, a pattern matching the names of the quarterly table sheets, with
+# the year if it's in the name to check the title against, the column with
+# the reference for the organisation, and the measure in each column, by
+# position.
+tables = {
+    "P153": {
+        "path": "var/cache/P153.ods",
+        "skiprows": 19,
+        "skipfooter": 15,
+        "sheets": r"P153(?: (?P<year>\d{4}))?",
+        "reference": 1,
+        "measures": {50: "volume", 57: "percentage"},
+    },
+}
+
+fields = ["organisation", "table", "period", "measure", "value"]
+
+# Month numbers by name, for periods in table titles
+months = {name: number for number, name in enumerate(calendar.month_name) if name}
+
+
+def sheet_period(name, match, rows, skiprows):
+    """The period of a sheet, as the year and month of the quarter ending
+    in the title above the table, checked against any year in its name."""
+    pattern = re.compile(rf"\b({'|'.join(months)}) (\d{{4}})\b")
+    cells = (str(cell) for row in rows[:skiprows] for cell in row)
+    found = next(filter(None, map(pattern.search, cells)), None)
+    if found is None:
+        sys.exit(f"Error: no month and year found in the title of sheet {name}")
+
+    year = match.groupdict().get("year")
+    if year and year != found.group(2):
+        sys.exit(f"Error: sheet {name} has a title for {found.group(0)}, not {year}")
+    return f"{found.group(2)}-{months[found.group(1)]:02d}"
+
+
+def extract(table, layout, organisations):
+    """Extract the statistics from each sheet of a table, in long form."""
+    measures = layout["measures"]
+    for name, rows in read_sheets(layout["path"]).items():
+        match = re.fullmatch(layout["sheets"], name)
+        if not match:
+            continue
+
+        period = sheet_period(name, match, rows, layout["skiprows"])
+        df = read_table(
+            rows, skiprows=layout["skiprows"], skipfooter=layout["skipfooter"]
+        )
+        if len(df.columns) <= max(measures):
+            continue
+
+        df = df.iloc[:, [layout["reference"]] + list(measures)].set_axis(
+            ["reference"] + list(measures.values()), axis=1
+        )
+        df["organisation"] = df["reference"].astype(str).map(organisations)
+        df = df[df["organisation"].notna()].melt(
+            id_vars=["organisation"],
+            value_vars=list(measures.values()),
+            var_name="measure",
+            value_name="value",
+        )
+
+        # values such as ~ and - mark a missing statistic
+        df["value"] = pd.to_numeric(df["value"], errors="coerce")
+        df = df.dropna(subset=["value"])
+
+        df["table"] = table
+        df["period"] = period
+        yield df[fields]
+
+
+def main():
+    """Main entry point."""
+    organisations = organisation_references()
+
+    # write to a temporary file, so a failed extract leaves no partial target
+    path = sys.argv[1]
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", newline="") as f:
+            f.write(",".join(fields) + "\n")
+            for table, layout in tables.items():
+                if not os.path.exists(layout["path"]):
+                    print(
+                        f"Warning: {layout['path']} not found, skipping {table}...",
+                        file=sys.stderr,
+                    )
+                    continue
+
+                print(f"Extracting {table} statistics...", file=sys.stderr)
+                for df in extract(table, layout, organisations):
+                    df.to_csv(f, header=False, index=False)
+
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+if __name__ == "__main__":
+    main()
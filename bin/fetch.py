@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+"""
+Fetch a downloaded input through a content-addressed store of fixtures.
+
+usage: fetch.py [--offline] [--jobs N] URL PATH [URL PATH ...]
+       fetch.py --export fixtures.tar.gz
+       fetch.py --import fixtures.tar.gz
+
+Each download is kept in the store by the hash of its contents, with an
+index of the hash, ETag and Last-Modified for each URL, so later fetches
+are conditional requests, and a build can run from the store alone, or
+from a bundle of the store exported on another machine.
+
+Several URLs are fetched concurrently, and each PATH is only written
+when its contents change, so make only rebuilds what depends on it.
+"""
+
+import os
+import sys
+import json
+import fcntl
+import shutil
+import hashlib
+import tarfile
+import argparse
+import tempfile
+import urllib.request
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from datetime import datetime, timezone
+
+STORE_DIR = "fixtures/"
+TIMEOUT = 60
+JOBS = 8
+
+
+class FetchError(Exception):
+    pass
+
+
+def object_path(store, sha256):
+    """The path of an object in the store."""
+    return os.path.join(store, "objects", sha256[:2], sha256)
+
+
+def load_index(store):
+    """Load the entry for each URL in the store."""
+    try:
+        with open(os.path.join(store, "index.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+@contextmanager
+def locked(store):
+    """Hold the lock on the store's index, so fetches running at the same
+    time, such as from make -j, don't overwrite each other's entries."""
+    os.makedirs(store, exist_ok=True)
+    with open(os.path.join(store, "index.lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def save_index(store, index):
+    """Save the entry for each URL in the store."""
+    path = os.path.join(store, "index.json")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def add_object(store, f):
+    """Copy the contents of a file object into the store, returning its hash."""
+    os.makedirs(os.path.join(store, "objects"), exist_ok=True)
+    h = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=os.path.join(store, "objects"), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+                out.write(block)
+        sha256 = h.hexdigest()
+        path = object_path(store, sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return sha256
+
+
+def file_hash(path):
+    """Hash the contents of a file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def install(store, sha256, path):
+    """Copy an object from the store to a path, unless it's already there."""
+    if os.path.exists(path) and file_hash(path) == sha256:
+        return False
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    shutil.copyfile(object_path(store, sha256), tmp)
+    os.replace(tmp, path)
+    return True
+
+
+def cached(store, entry):
+    """Check the object for an entry is in the store."""
+    return entry is not None and os.path.exists(object_path(store, entry["sha256"]))
+
+
+def download(url, store, entry):
+    """Download a URL into the store, unless it hasn't changed since the entry."""
+    request = urllib.request.Request(url)
+    if cached(store, entry):
+        if entry.get("etag"):
+            request.add_header("If-None-Match", entry["etag"])
+        if entry.get("last-modified"):
+            request.add_header("If-Modified-Since", entry["last-modified"])
+
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+            sha256 = add_object(store, response)
+            headers = response.headers
+    except HTTPError as e:
+        if e.code == 304 and cached(store, entry):
+            return dict(entry, checked=now())
+        raise
+
+    return {
+        "sha256": sha256,
+        "etag": headers.get("ETag", ""),
+        "last-modified": headers.get("Last-Modified", ""),
+        "checked": now(),
+    }
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def resolve(url, store, entry, offline=False):
+    """Find the entry for a URL, downloading it unless offline."""
+    if offline:
+        if not cached(store, entry):
+            raise FetchError(f"{url} is not in {store}, and fetching is offline")
+        return entry
+
+    try:
+        return download(url, store, entry)
+    except (HTTPError, URLError, OSError) as e:
+        if not cached(store, entry):
+            raise FetchError(f"{url}: {e}") from e
+        print(f"Warning: {url}: {e}, using the stored copy...", file=sys.stderr)
+        return entry
+
+
+def fetch(downloads, store=STORE_DIR, offline=False, jobs=JOBS):
+    """Fetch each URL to its path through the store, several at a time."""
+    index = load_index(store)
+
+    def task(download):
+        url, path = download
+        try:
+            entry = resolve(url, store, index.get(url), offline)
+            return url, entry, install(store, entry["sha256"], path), None
+        except FetchError as e:
+            return url, None, False, e
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(task, downloads))
+
+    entries = {url: entry for url, entry, changed, error in results if entry}
+    if entries and not offline:
+        with locked(store):
+            index = load_index(store)
+            index.update(entries)
+            save_index(store, index)
+
+    changed = sum(changed for url, entry, changed, error in results)
+    print(f"Fetched {len(results)} files, {changed} changed", file=sys.stderr)
+
+    errors = [error for url, entry, changed, error in results if error]
+    if errors:
+        raise FetchError("\n".join(str(error) for error in errors))
+
+
+def export_bundle(store, path):
+    """Bundle the index and every object it refers to into a tar file."""
+    index = load_index(store)
+    with tarfile.open(path, "w:gz") as tar:
+        tar.add(os.path.join(store, "index.json"), arcname="index.json")
+        for sha256 in sorted({entry["sha256"] for entry in index.values()}):
+            tar.add(object_path(store, sha256), arcname=f"objects/{sha256}")
+
+
+def import_bundle(store, path):
+    """Add the index entries and objects from a bundle to the store."""
+    with tarfile.open(path, "r:*") as tar:
+        bundled = json.load(tar.extractfile("index.json"))
+        for member in tar.getmembers():
+            if not member.isfile() or not member.name.startswith("objects/"):
+                continue
+            sha256 = add_object(store, tar.extractfile(member))
+            if member.name != f"objects/{sha256}":
+                raise FetchError(f"{path}: {member.name} doesn't match its contents")
+
+    with locked(store):
+        index = load_index(store)
+        index.update(bundled)
+        save_index(store, index)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("downloads", nargs="*", metavar="URL PATH")
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=JOBS,
+        help=f"number of URLs to fetch at a time (default {JOBS})",
+    )
+    parser.add_argument(
+        "--store",
+        default=os.environ.get("FETCH_STORE", STORE_DIR),
+        help=f"directory of stored downloads (default {STORE_DIR})",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        default=bool(os.environ.get("OFFLINE")),
+        help="only use the store, failing for anything not in it",
+    )
+    parser.add_argument("--export", metavar="BUNDLE", help="bundle the store")
+    parser.add_argument(
+        "--import", dest="bundle", metavar="BUNDLE", help="add a bundle to the store"
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.export:
+            export_bundle(args.store, args.export)
+        elif args.bundle:
+            import_bundle(args.store, args.bundle)
+        elif args.downloads and len(args.downloads) % 2 == 0:
+            downloads = list(zip(args.downloads[::2], args.downloads[1::2]))
+            fetch(downloads, args.store, args.offline, args.jobs)
+        else:
+            parser.error("pairs of URL and PATH, --export or --import are required")
+    except FetchError as e:
+        sys.exit(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
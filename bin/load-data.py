@@ -8,6 +8,7 @@ Extracts data processing logic from various bin scripts.
 import sys
 import csv
 import sqlite3
+from collections import namedtuple
 from datetime import datetime
 
 csv.field_size_limit(sys.maxsize)
@@ -46,13 +47,87 @@ odp_datasets = {
     "tree-preservation-zone": "TPZ",
 }
 
+# Interventions funding each bucket of organisations
+funding_buckets = {
+    "Software": ["software", "integration", "improvement"],
+    "PropTech": ["engagement", "innovation"],
+}
+
+# Interventions in each bucket shown on the award maps and charts
+award_buckets = {
+    "PropTech": ["innovation", "engagement"],
+    "Software": ["software", "integration", "improvement"],
+    "Plan-making": ["plan-making", "local-plan-pathfinders", "local-plan-delivery", "green-belt-reviews"],
+}
+
+# An organisation's score packs these flags into its decimal digits, so
+# ordering by score ranks by adoption, then data quality, funding and projects
+score_weights = {
+    "localgov-drupal": 10,
+    "local-land-charges": 100,
+    "proptech": 1000,
+    "open-digital-planning": 10000,
+    "interested": 10**9,
+    "adopting": 10**10,
+    "live": 10**11,
+}
+funded_weight = 10**5
+data_score_weight = 10**6
+
+# Secondary indexes for the lookups made by bin/render.py
+indexes = {
+    "awards_organisation": "awards (organisation)",
+    "awards_fund": "awards (fund)",
+    "awards_intervention": "awards (intervention)",
+    "adoptions_organisation_product": "adoptions (organisation, product)",
+    "adoptions_product": "adoptions (product)",
+    "project_organisations_organisation": "project_organisations (organisation)",
+    "organisations_local_planning_authority": "organisations (local_planning_authority)",
+    "award_organisations_organisation": "award_organisations (organisation)",
+    "statistics_table_measure": 'statistics ("table", measure, period)',
+}
+
+# The database is rebuilt from scratch on each run, so trade durability for speed
+build_pragmas = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": "-65536",
+}
+
 
-def load_csv(path, key, opt=None):
-    """Load CSV file into dictionary keyed by specified column."""
+def load_csv(path, key, opt=None, fields=None):
+    """Load CSV file into dictionary keyed by specified column.
+
+    If fields are given, only those columns are kept, as a named tuple
+    with the hyphens in the field names replaced by underscores, and as
+    with csv.DictReader, blank lines are skipped, and missing values on
+    short lines are left empty.
+    """
     d = {}
-    for row in csv.DictReader(open(path, newline="")):
-        if (not opt) or opt(row):
-            d[row[key]] = row
+    with open(path, newline="") as f:
+        if fields is None:
+            for row in csv.DictReader(f):
+                if (not opt) or opt(row):
+                    d[row[key]] = row
+            return d
+
+        Record = namedtuple("Record", [field.replace("-", "_") for field in fields])
+        reader = csv.reader(f)
+        header = next(reader, [])
+        for field in [key] + fields:
+            if field not in header:
+                raise ValueError(f"{path} has no {field} column")
+
+        key_column = header.index(key)
+        columns = [header.index(field) for field in fields]
+        for row in reader:
+            if not row:
+                continue
+            row += [""] * (len(header) - len(row))
+            record = Record._make([row[column] for column in columns])
+            if (not opt) or opt(record):
+                d[row[key_column]] = record
     return d
 
 
@@ -131,6 +206,18 @@ def create_schema(conn):
         )
     """)
 
+    # Award organisations (many-to-many), the lead and partners on each award
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS award_organisations (
+            award TEXT,
+            organisation TEXT,
+            role TEXT,
+            PRIMARY KEY (award, organisation, role),
+            FOREIGN KEY (award) REFERENCES awards(award),
+            FOREIGN KEY (organisation) REFERENCES organisations(organisation)
+        )
+    """)
+
     # Interventions table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS interventions (
@@ -176,45 +263,303 @@ def create_schema(conn):
         )
     """)
 
+    # Planning application statistics, in long form
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS statistics (
+            organisation TEXT,
+            "table" TEXT,
+            period TEXT,
+            measure TEXT,
+            value REAL,
+            PRIMARY KEY (organisation, "table", period, measure),
+            FOREIGN KEY (organisation) REFERENCES organisations(organisation)
+        )
+    """)
+
+    # Summary tables, materialised at load time for the pages
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS product_funnel (
+            product TEXT PRIMARY KEY,
+            lpa INTEGER,
+            active_lpa INTEGER,
+            odp INTEGER,
+            funded INTEGER,
+            software INTEGER,
+            providing INTEGER,
+            data_ready INTEGER,
+            interested_or_adopting INTEGER,
+            live INTEGER,
+            FOREIGN KEY (product) REFERENCES products(product)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fund_totals (
+            fund TEXT PRIMARY KEY,
+            award_count INTEGER,
+            organisation_count INTEGER,
+            total_amount INTEGER,
+            FOREIGN KEY (fund) REFERENCES funds(fund)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS intervention_totals (
+            intervention TEXT PRIMARY KEY,
+            award_count INTEGER,
+            organisation_count INTEGER,
+            total_amount INTEGER,
+            FOREIGN KEY (intervention) REFERENCES interventions(intervention)
+        )
+    """)
+
+    # The award bucket of each organisation, overall (the "all" scope),
+    # and counting only its awards from a fund, for an intervention, or
+    # for organisations in a project
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS organisation_buckets (
+            scope TEXT,
+            scope_value TEXT,
+            organisation TEXT,
+            bucket TEXT,
+            PRIMARY KEY (scope, scope_value, organisation),
+            FOREIGN KEY (organisation) REFERENCES organisations(organisation)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS award_totals (
+            award_count INTEGER,
+            total_amount INTEGER,
+            direct_orgs INTEGER,
+            partner_orgs INTEGER
+        )
+    """)
+
     conn.commit()
 
 
+def create_indexes(conn):
+    """Create secondary indexes, after loading so they're built in one pass."""
+    cursor = conn.cursor()
+    for name, columns in indexes.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+
+def score_organisations(cursor):
+    """Calculate the funding, bucket, data score and score of every organisation.
+
+    The score starts as the number of projects the organisation is
+    listed against, and has a weight added for each of its projects,
+    interventions and adoption statuses found in score_weights.
+    """
+    software = funding_buckets["Software"]
+    proptech = funding_buckets["PropTech"]
+
+    def placeholders(items):
+        return ", ".join(["?"] * len(items))
+
+    def pairs(d):
+        return ", ".join(["(?, ?)"] * len(d))
+
+    cursor.execute(f"""
+        WITH weights (name, weight) AS (
+            VALUES {pairs(score_weights)}
+        ),
+        statuses (status, score) AS (
+            VALUES {pairs(quality_scores)}
+        ),
+        members (name, organisation) AS (
+            SELECT project, organisation FROM project_organisations
+            UNION
+            SELECT intervention, organisation FROM awards
+            UNION
+            SELECT 'open-digital-planning', ao.organisation
+            FROM award_organisations ao
+            JOIN awards a ON a.award = ao.award
+            WHERE a.intervention IN ({placeholders(software + proptech)})
+            UNION
+            SELECT adoption_status, organisation FROM adoptions
+        ),
+        memberships AS (
+            SELECT m.organisation, SUM(w.weight) AS score
+            FROM members m
+            JOIN weights w ON w.name = m.name
+            GROUP BY m.organisation
+        ),
+        funding AS (
+            SELECT organisation,
+                SUM(CASE WHEN intervention IN ({placeholders(software)}) THEN amount ELSE 0 END) AS software_amount,
+                SUM(CASE WHEN intervention IN ({placeholders(proptech)}) THEN amount ELSE 0 END) AS proptech_amount,
+                MAX(intervention IN ({placeholders(software)})) AS software,
+                MAX(intervention IN ({placeholders(proptech)})) AS proptech
+            FROM awards
+            GROUP BY organisation
+        ),
+        data AS (
+            SELECT q.organisation,
+                MAX(q.ready_for_odp_adoption = 'yes') AS data_ready,
+                SUM(s.score) + 100 * MAX(q.ready_for_odp_adoption = 'yes') AS data_score
+            FROM quality q
+            JOIN statuses s ON s.status = q.status
+            GROUP BY q.organisation
+        ),
+        scores AS (
+            SELECT o.organisation,
+                COALESCE(f.software_amount, 0) AS software_amount,
+                COALESCE(f.proptech_amount, 0) AS proptech_amount,
+                CASE
+                    WHEN f.software AND f.proptech THEN 'Both'
+                    WHEN f.software THEN 'Software'
+                    WHEN f.proptech THEN 'PropTech'
+                    ELSE ''
+                END AS bucket,
+                COALESCE(d.data_ready, 0) AS data_ready,
+                COALESCE(d.data_score, 0) AS data_score,
+                COALESCE(m.score, 0) AS membership_score
+            FROM organisations o
+            LEFT JOIN funding f ON f.organisation = o.organisation
+            LEFT JOIN data d ON d.organisation = o.organisation
+            LEFT JOIN memberships m ON m.organisation = o.organisation
+        )
+        UPDATE organisations SET
+            amount = s.software_amount + s.proptech_amount,
+            software_amount = s.software_amount,
+            proptech_amount = s.proptech_amount,
+            bucket = s.bucket,
+            data_ready = s.data_ready,
+            data_score = s.data_score,
+            score = organisations.score + s.membership_score
+                + (s.software_amount + s.proptech_amount != 0) * ?
+                + s.data_score * ?
+        FROM scores s
+        WHERE s.organisation = organisations.organisation
+    """, (
+        *[value for item in score_weights.items() for value in item],
+        *[value for item in quality_scores.items() for value in item],
+        *software, *proptech,
+        *software, *proptech,
+        *software, *proptech,
+        funded_weight,
+        data_score_weight,
+    ))
+
+
+def summarise(cursor):
+    """Build the summary tables from the loaded data."""
+    cursor.execute("""
+        INSERT INTO product_funnel
+        SELECT p.product,
+            (SELECT COUNT(*) FROM organisations WHERE role = 'local-planning-authority'),
+            (SELECT COUNT(*) FROM organisations
+             WHERE role = 'local-planning-authority'
+             AND (end_date IS NULL OR end_date = '' OR end_date > date('now'))),
+            (SELECT COUNT(DISTINCT organisation) FROM project_organisations WHERE project = 'open-digital-planning'),
+            (SELECT COUNT(*) FROM organisations WHERE amount > 0),
+            (SELECT COUNT(*) FROM organisations WHERE software_amount > 0),
+            (SELECT COUNT(*) FROM organisations WHERE data_score >= 4 AND data_score < 100),
+            (SELECT COUNT(*) FROM organisations WHERE data_ready = 1),
+            (SELECT COUNT(DISTINCT o.organisation)
+             FROM organisations o
+             JOIN adoptions a ON o.organisation = a.organisation
+             WHERE a.product = p.product AND a.adoption_status IN ('interested', 'adopting')),
+            (SELECT COUNT(DISTINCT o.organisation)
+             FROM organisations o
+             JOIN adoptions a ON o.organisation = a.organisation
+             WHERE a.product = p.product AND a.adoption_status = 'live')
+        FROM products p
+    """)
+
+    cursor.execute("""
+        INSERT INTO fund_totals
+        SELECT f.fund, COUNT(a.award), COUNT(DISTINCT a.organisation), COALESCE(SUM(a.amount), 0)
+        FROM funds f
+        LEFT JOIN awards a ON f.fund = a.fund
+        GROUP BY f.fund
+    """)
+
+    cursor.execute("""
+        INSERT INTO intervention_totals
+        SELECT i.intervention, COUNT(a.award), COUNT(DISTINCT a.organisation), COALESCE(SUM(a.amount), 0)
+        FROM interventions i
+        LEFT JOIN awards a ON i.intervention = a.intervention
+        GROUP BY i.intervention
+    """)
+
+    cursor.execute("""
+        INSERT INTO award_totals
+        SELECT COUNT(*), COALESCE(SUM(amount), 0), COUNT(DISTINCT organisation),
+            (SELECT COUNT(DISTINCT organisation) FROM award_organisations WHERE role = 'partner')
+        FROM awards
+    """)
+
+
+def bucket_organisations(cursor):
+    """Find the award bucket of each organisation, overall and in each scope."""
+    interventions = {}
+    cursor.execute("SELECT organisation, intervention, fund FROM awards")
+    for organisation, intervention, fund in cursor.fetchall():
+        for scope, value in [("all", ""), ("fund", fund), ("intervention", intervention)]:
+            interventions.setdefault((scope, value, organisation), set()).add(intervention)
+
+    # a project's organisations are bucketed by all of their awards
+    cursor.execute("SELECT project, organisation FROM project_organisations")
+    for project, organisation in cursor.fetchall():
+        if ("all", "", organisation) in interventions:
+            interventions[("project", project, organisation)] = interventions[("all", "", organisation)]
+
+    bucket_rows = []
+    for (scope, value, organisation), ids in interventions.items():
+        bucket = "_".join(sorted(name for name, members in award_buckets.items() if ids & set(members)))
+        if bucket:
+            bucket_rows.append((scope, value, organisation, bucket))
+
+    cursor.executemany("""
+        INSERT INTO organisation_buckets (scope, scope_value, organisation, bucket)
+        VALUES (?, ?, ?, ?)
+    """, bucket_rows)
+
+
 def load_data(conn):
-    """Load all data from CSV files into database."""
+    """Load all data from CSV files into database, in a single transaction."""
     cursor = conn.cursor()
+    cursor.execute("BEGIN")
 
     # Load reference data
     print("Loading organisations...", file=sys.stderr)
-    organisations = load_csv("var/cache/organisation.csv", "organisation")
+    organisations = load_csv("var/cache/organisation.csv", "organisation",
+                             fields=["entity", "name", "end-date", "local-planning-authority"])
 
     print("Loading local planning authorities...", file=sys.stderr)
-    lpas = load_csv("var/cache/local-planning-authority.csv", "reference")
+    lpas = load_csv("var/cache/local-planning-authority.csv", "reference", fields=["name"])
 
     print("Loading interventions...", file=sys.stderr)
     interventions = load_csv("specification/intervention.csv", "intervention")
-    for intervention, row in interventions.items():
-        cursor.execute("""
-            INSERT OR REPLACE INTO interventions (intervention, name, description)
-            VALUES (?, ?, ?)
-        """, (intervention, row.get("name", ""), row.get("description", "")))
+    cursor.executemany("""
+        INSERT OR REPLACE INTO interventions (intervention, name, description)
+        VALUES (?, ?, ?)
+    """, [
+        (intervention, row.get("name", ""), row.get("description", ""))
+        for intervention, row in interventions.items()
+    ])
 
     print("Loading funds...", file=sys.stderr)
     funds = load_csv("specification/fund.csv", "fund")
-    for fund, row in funds.items():
-        cursor.execute("""
-            INSERT OR REPLACE INTO funds (fund, name, description, start_date, documentation_url)
-            VALUES (?, ?, ?, ?, ?)
-        """, (fund, row.get("name", ""), row.get("description", ""), row.get("start-date", ""), row.get("documentation-url", "")))
+    cursor.executemany("""
+        INSERT OR REPLACE INTO funds (fund, name, description, start_date, documentation_url)
+        VALUES (?, ?, ?, ?, ?)
+    """, [
+        (fund, row.get("name", ""), row.get("description", ""), row.get("start-date", ""), row.get("documentation-url", ""))
+        for fund, row in funds.items()
+    ])
 
     print("Loading awards...", file=sys.stderr)
     awards = load_csv("specification/award.csv", "award")
 
+    award_rows = []
+    award_organisation_rows = []
     for award, row in awards.items():
-        cursor.execute("""
-            INSERT OR REPLACE INTO awards
-            (award, start_date, end_date, organisation, intervention, fund, amount, organisations, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        award_rows.append((
             award,
             row.get("start-date", ""),
             row.get("end-date", ""),
@@ -226,25 +571,47 @@ def load_data(conn):
             row.get("notes", "")
         ))
 
+        members = [(row.get("organisation", ""), "lead")]
+        for partner in row.get("organisations", "").split(";"):
+            members.append((partner.strip(), "partner"))
+
+        for organisation, role in members:
+            if organisation:
+                award_organisation_rows.append((award, organisation, role))
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO awards
+        (award, start_date, end_date, organisation, intervention, fund, amount, organisations, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, award_rows)
+
+    cursor.executemany("""
+        INSERT OR IGNORE INTO award_organisations (award, organisation, role)
+        VALUES (?, ?, ?)
+    """, award_organisation_rows)
+
     print("Loading quality data...", file=sys.stderr)
     quality_data = load_csv("data/quality.csv", "organisation")
 
     # Fixup quality status
+    quality_rows = []
     for organisation, row in quality_data.items():
         for dataset in odp_datasets:
             original_value = row.get(dataset, "")
             row[dataset] = quality_lookup.get(original_value, "")
 
-            cursor.execute("""
-                INSERT OR REPLACE INTO quality (organisation, dataset, status, ready_for_odp_adoption)
-                VALUES (?, ?, ?, ?)
-            """, (
+            quality_rows.append((
                 organisation,
                 dataset,
                 row[dataset],
                 row.get("ready_for_ODP_adoption", "")
             ))
 
+    cursor.executemany("""
+        INSERT OR REPLACE INTO quality (organisation, dataset, status, ready_for_odp_adoption)
+        VALUES (?, ?, ?, ?)
+    """, quality_rows)
+
     print("Loading organisation roles...", file=sys.stderr)
     organisation_roles = {}
     for row in csv.DictReader(open("specification/role-organisation.csv", newline="")):
@@ -261,11 +628,10 @@ def load_data(conn):
         "localgov-drupal": "LocalGov Drupal",
     }
 
-    for project, name in projects.items():
-        cursor.execute("""
-            INSERT OR REPLACE INTO projects (project, name, description)
-            VALUES (?, ?, ?)
-        """, (project, name, ""))
+    cursor.executemany("""
+        INSERT OR REPLACE INTO projects (project, name, description)
+        VALUES (?, ?, ?)
+    """, [(project, name, "") for project, name in projects.items()])
 
     print("Loading products...", file=sys.stderr)
     products_list = {
@@ -274,20 +640,14 @@ def load_data(conn):
         "dsn/dpr": "Digital Site Notice / Digital Planning Register"
     }
 
-    for product, name in products_list.items():
-        cursor.execute("""
-            INSERT OR REPLACE INTO products (product, name, description)
-            VALUES (?, ?, ?)
-        """, (product, name, ""))
+    cursor.executemany("""
+        INSERT OR REPLACE INTO products (product, name, description)
+        VALUES (?, ?, ?)
+    """, [(product, name, "") for product, name in products_list.items()])
 
-    # Build organisation data with sets for tracking
+    # Build organisation data
     print("Processing organisations...", file=sys.stderr)
     rows = {}
-    sets = {}
-
-    adoption_status_values = ["interested", "adopting", "live"]
-    for status in adoption_status_values:
-        sets.setdefault(status, set())
 
     def add_organisation(organisation, role):
         if organisation not in rows:
@@ -295,25 +655,17 @@ def load_data(conn):
                 "organisation": organisation,
                 "role": role,
                 "score": 0,
-                "data-score": 0,
                 "adoption": "",
-                "amount": 0,
-                "PropTech": 0,
-                "Software": 0,
-                "bucket": ""
             }
 
-    def set_add(name, organisation):
-        sets.setdefault(name, set())
-        sets[name].add(organisation)
-
     # Add LPAs
     for organisation, roles in organisation_roles.items():
-        if "local-planning-authority" in roles and not organisations[organisation]["end-date"]:
+        if "local-planning-authority" in roles and not organisations[organisation].end_date:
             add_organisation(organisation, role="local-planning-authority")
 
     # Load project organisations
     print("Loading project organisations...", file=sys.stderr)
+    project_organisation_rows = []
     for row in csv.DictReader(open("specification/project-organisation.csv", newline="")):
         if row["end-date"]:
             continue
@@ -328,93 +680,43 @@ def load_data(conn):
                 role = "other"
             add_organisation(organisation, role=role)
 
-        set_add(project, organisation)
         rows[organisation]["score"] = rows[organisation]["score"] + 1
 
-        cursor.execute("""
-            INSERT OR REPLACE INTO project_organisations (project, organisation, start_date, end_date)
-            VALUES (?, ?, ?, ?)
-        """, (project, organisation, row.get("start-date", ""), row.get("end-date", "")))
+        project_organisation_rows.append((project, organisation, row.get("start-date", ""), row.get("end-date", "")))
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO project_organisations (project, organisation, start_date, end_date)
+        VALUES (?, ?, ?, ?)
+    """, project_organisation_rows)
 
     # Process funding awards
     print("Processing funding awards...", file=sys.stderr)
+    award_project_rows = []
     for award, row in awards.items():
         organisation = row["organisation"]
         intervention = row["intervention"]
-        partners = filter(None, row.get("organisations", "").split(";"))
-
-        # ODP membership
-        if intervention in ["engagement", "innovation", "software", "integration", "improvement"]:
-            set_add("open-digital-planning", organisation)
-            for partner in partners:
-                set_add("open-digital-planning", partner)
 
         if organisation not in rows:
             add_organisation(organisation, "")
 
-        set_add(intervention, organisation)
-
         # Add organisation to the intervention's project
         if intervention in interventions:
             project = interventions[intervention].get("project", "")
             if project:
-                cursor.execute("""
-                    INSERT OR IGNORE INTO project_organisations (project, organisation, start_date, end_date)
-                    VALUES (?, ?, ?, ?)
-                """, (project, organisation, row.get("start-date", ""), ""))
-                set_add(project, organisation)
-
-        if intervention in ["software", "integration", "improvement"]:
-            bucket = "Software"
-        elif intervention in ["engagement", "innovation"]:
-            bucket = "PropTech"
-        else:
-            continue
-
-        amount = int(row["amount"])
+                award_project_rows.append((project, organisation, row.get("start-date", ""), ""))
 
-        set_add(bucket, organisation)
-        set_add("funded", organisation)
-
-        o = rows[organisation]
-        o.setdefault("PropTech", 0)
-        o.setdefault("Software", 0)
-
-        if bucket == "PropTech":
-            o["PropTech"] += amount
-        else:
-            o["Software"] += amount
-
-        o["amount"] += amount
-
-    # Determine bucket classification
-    for organisation, row in rows.items():
-        row.setdefault("Software", 0)
-        row.setdefault("PropTech", 0)
-        if organisation in sets.get("PropTech", set()) and organisation in sets.get("Software", set()):
-            row["bucket"] = "Both"
-        elif organisation in sets.get("Software", set()):
-            row["bucket"] = "Software"
-        elif organisation in sets.get("PropTech", set()):
-            row["bucket"] = "PropTech"
-        else:
-            row["bucket"] = ""
-
-    # Add data quality flags
-    print("Processing data quality...", file=sys.stderr)
-    for organisation, row_data in quality_data.items():
-        if row_data.get("ready_for_ODP_adoption") == "yes":
-            set_add("data-ready", organisation)
+    cursor.executemany("""
+        INSERT OR IGNORE INTO project_organisations (project, organisation, start_date, end_date)
+        VALUES (?, ?, ?, ?)
+    """, award_project_rows)
 
     # Add adoption data
     print("Loading adoptions...", file=sys.stderr)
+    adoption_rows = []
     for row in csv.DictReader(open("data/adoption.csv", newline="")):
         organisation = row["organisation"]
 
-        cursor.execute("""
-            INSERT INTO adoptions (start_date, organisation, product, adoption_status, documentation_url)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
+        adoption_rows.append((
             row.get("start-date", ""),
             organisation,
             row.get("product", ""),
@@ -422,10 +724,14 @@ def load_data(conn):
             row.get("documentation-url", "")
         ))
 
-        set_add(row["adoption-status"], organisation)
         if organisation in rows:
             rows[organisation]["adoption"] = row["adoption-status"]
 
+    cursor.executemany("""
+        INSERT INTO adoptions (start_date, organisation, product, adoption_status, documentation_url)
+        VALUES (?, ?, ?, ?, ?)
+    """, adoption_rows)
+
     # Load P153 statistics
     print("Loading P153 statistics...", file=sys.stderr)
     try:
@@ -437,75 +743,66 @@ def load_data(conn):
     except FileNotFoundError:
         print("Warning: p153.csv not found, skipping...", file=sys.stderr)
 
-    # Calculate scores
-    print("Calculating scores...", file=sys.stderr)
-    sets["providing"] = set()
-    for organisation, row in rows.items():
-        shift = 10
-        for project in ["localgov-drupal", "local-land-charges", "proptech", "open-digital-planning"]:
-            if organisation in sets.get(project, set()):
-                row["score"] += shift
-            shift *= 10
-
-        if row["amount"]:
-            row["score"] += shift
-        shift *= 10
-
-        if organisation in quality_data:
-            for dataset in odp_datasets:
-                n = quality_scores[quality_data[organisation].get(dataset, "")]
-                row["data-score"] += n
-            if row["data-score"] >= 4:
-                set_add("providing", organisation)
-            if organisation in sets.get("data-ready", set()):
-                row["data-score"] += 100
-            row["score"] += row["data-score"] * shift
-
-        shift *= 1000
-
-        for status in adoption_status_values:
-            if organisation in sets.get(status, set()):
-                row["score"] += shift
-            shift *= 10
+    # Stream the planning application statistics, which may be large
+    print("Loading planning application statistics...", file=sys.stderr)
+    try:
+        with open("var/cache/statistics.csv", newline="") as f:
+            cursor.executemany("""
+                INSERT OR REPLACE INTO statistics (organisation, "table", period, measure, value)
+                VALUES (?, ?, ?, ?, ?)
+            """, (
+                (row["organisation"], row["table"], row["period"], row["measure"], float(row["value"]))
+                for row in csv.DictReader(f)
+            ))
+    except FileNotFoundError:
+        print("Warning: statistics.csv not found, skipping...", file=sys.stderr)
 
     # Add area names and insert organisations
     print("Inserting organisations...", file=sys.stderr)
+    organisation_rows = []
     for organisation, row in rows.items():
         org_data = organisations[organisation]
-        lpa = org_data.get("local-planning-authority", "")
+        lpa = org_data.local_planning_authority
         if lpa:
-            area_name = lpas.get(lpa, row).get("name", "").replace(" LPA", "")
+            area_name = lpas[lpa].name.replace(" LPA", "") if lpa in lpas else ""
         else:
-            area_name = org_data.get("name", "")
-
-        data_ready = 1 if organisation in sets.get("data-ready", set()) else 0
+            area_name = org_data.name
 
-        cursor.execute("""
-            INSERT OR REPLACE INTO organisations
-            (organisation, entity, name, role, end_date, local_planning_authority,
-             area_name, score, data_score, adoption_status, amount,
-             proptech_amount, software_amount, bucket, data_ready, volume, percentage)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        organisation_rows.append((
             organisation,
-            org_data.get("entity", ""),
-            org_data.get("name", ""),
+            org_data.entity,
+            org_data.name,
             row.get("role", ""),
-            org_data.get("end-date", ""),
+            org_data.end_date,
             lpa,
             area_name,
             row.get("score", 0),
-            row.get("data-score", 0),
             row.get("adoption", ""),
-            row.get("amount", 0),
-            row.get("PropTech", 0),
-            row.get("Software", 0),
-            row.get("bucket", ""),
-            data_ready,
             row.get("volume", ""),
             row.get("percentage", "")
         ))
 
+    cursor.executemany("""
+        INSERT OR REPLACE INTO organisations
+        (organisation, entity, name, role, end_date, local_planning_authority,
+         area_name, score, adoption_status, volume, percentage)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, organisation_rows)
+
+    print("Calculating scores...", file=sys.stderr)
+    score_organisations(cursor)
+
+    print("Summarising...", file=sys.stderr)
+    summarise(cursor)
+    bucket_organisations(cursor)
+
+    print("Indexing...", file=sys.stderr)
+    create_indexes(conn)
+
+    # Gather statistics for the query planner
+    print("Analysing...", file=sys.stderr)
+    cursor.execute("ANALYZE")
+
     conn.commit()
     print("Data loading complete!", file=sys.stderr)
 
@@ -523,6 +820,8 @@ def main():
 
     # Create new database
     conn = sqlite3.connect(DATABASE_PATH)
+    for pragma, value in build_pragmas.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
 
     try:
         create_schema(conn)
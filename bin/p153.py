@@ -1,45 +1,61 @@
 #!/usr/bin/env python3
 
+"""
+Extract planning application statistics from the P153 spreadsheet.
+
+usage: p153.py P153.ods p153.csv
+
+Writes the latest volume and percentage for each organisation from the
+sheet for the latest quarter. The quarterly history is extracted by
+bin/extract-statistics.py.
+"""
+
 import sys
-import csv
-import pandas as pd
-
-
-organisations = {
-    # patched for now ..
-    "E51000005": "development-corporation:Q115585981",
-    "E51000006": "development-corporation:Q117149370",
-    "E51000007": "development-corporation:Q124604981",
-    "E26000008": "national-park-authority:Q27178932",
-    "E26000011": "national-park-authority:Q27159704",
-    "E26000012": "national-park-authority:Q27178932",
+
+from spreadsheet import read_sheets, read_table, organisation_references
+
+
+# Columns in each table sheet, by position
+columns = {
+    0: "name",
+    1: "reference",
+    50: "volume",
+    57: "percentage",
 }
 
+# The sheet with the latest quarter, by position, after the cover sheet
+latest_sheet = 1
 
-def add_organisation(reference, row):
-    if row.get(reference, ""):
-        organisations[row[reference]] = row["organisation"]
+# Markers used in place of a value, removed from each column
+markers = {
+    "volume": "~",
+    "percentage": "-",
+}
 
 
-for row in csv.DictReader(open("var/cache/organisation.csv", newline="")):
-    add_organisation("local-authority-district", row)
-    add_organisation("local-planning-authority", row)
-    add_organisation("statistical-geography", row)
+def read_latest(path):
+    """Read the table for the latest quarter from the spreadsheet."""
+    sheets = list(read_sheets(path).values())
+    if len(sheets) > latest_sheet:
+        df = read_table(sheets[latest_sheet], skiprows=19, skipfooter=15)
+        if len(df.columns) > max(columns):
+            return df
+    sys.exit(f"Error: {path} has no table in sheet {latest_sheet} for the latest quarter")
 
 
-# Read a specific sheet into dataframe
-df=pd.read_excel(sys.argv[1], sheet_name=1, skiprows=19, skipfooter=15)
+def process_sheet(df):
+    """Add the named columns, and the organisation for each reference."""
+    for i, column in columns.items():
+        df[column] = df.iloc[:, i]
+    df["organisation"] = df["reference"].astype(str).map(organisations)
+    mapped = df["organisation"].notna()
+    for column, marker in markers.items():
+        cleaned = df[column].astype(str).str.replace(marker, "", regex=False)
+        df[column] = df[column].astype(object).where(~mapped, cleaned)
+    return df
 
-df.columns.values[0] = "name"
-df.columns.values[1] = "reference"
-df.columns.values[50] = "volume"
-df.columns.values[57] = "percentage"
 
-for index, row in df.iterrows():
-    reference = str(row["reference"])
-    if reference in organisations:
-        df.loc[index, 'organisation'] = organisations[reference]
-        df.loc[index, "volume"] = str(row["volume"]).replace("~", "")
-        df.loc[index, "percentage"] = str(row["percentage"]).replace("-", "")
+organisations = organisation_references()
 
+df = process_sheet(read_latest(sys.argv[1]))
 df.to_csv(sys.argv[2], header=True, index=False, columns=["organisation", "reference", "name", "volume", "percentage"])
@@ -8,14 +8,114 @@ import os
 import sys
 import re
 import sqlite3
-from math import pi, sqrt
+import argparse
+import json
+import time
+import gzip
+import hashlib
+import functools
+import multiprocessing
+import xml.etree.ElementTree as ET
+from math import hypot, pi, sqrt
 from datetime import datetime
 from urllib.parse import quote
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, meta
 from html import escape
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 DATABASE_PATH = "dataset/performance.sqlite3"
 BASE_PATH = "/performance"
+POINTS_SVG_PATH = "var/cache/point.svg"
+SHAPES_SVG_PATH = "var/cache/local-planning-authority.svg"
+SIMPLIFIED_SVG_DIR = "var/cache/simplified/"
+MANIFEST_PATH = "var/render-manifest.json"
+PROFILE_PATH = "var/render-profile.json"
+TEMPLATE_CACHE_DIR = "var/cache/templates/"
+
+# template output events gathered into each chunk streamed to a page's file
+STREAM_BUFFER = 256
+
+# decimal places kept in the coordinates of minified map path data
+PATH_PRECISION = 2
+
+# decimal places kept in the coordinates of simplified LPA boundaries
+SIMPLIFIED_PRECISION = 3
+
+# version of the simplification, to change whenever simplify_path changes its
+# output, so the cached simplified boundaries are made again
+SIMPLIFY_VERSION = 1
+
+# Tolerance, in map units, LPA boundaries are simplified to at each level of detail.
+# The maps are around 465 units across, and drawn at most 640px wide, so a
+# unit is about 1.4px, and neither simplified level moves a boundary by a pixel.
+detail_levels = {
+    "full": 0,
+    "medium": 0.25,
+    "low": 0.5,
+}
+
+# Level of detail of the LPA shapes in each map, by the filter the map is drawn
+# for, with the national map of every award kept at full detail
+map_detail = {
+    None: "full",
+    "fund": "medium",
+    "intervention": "medium",
+    "project": "medium",
+    "organisation": "low",
+}
+
+# numbers taken by each path command, by its relative form
+path_arity = {"m": 2, "l": 2, "h": 1, "v": 1, "c": 6, "s": 4, "q": 4, "t": 2, "a": 7}
+path_tokens = re.compile(
+    r"[MmLlHhVvCcSsQqTtAaZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+)
+
+# files in docs/ written alongside compressed copies by --compress
+COMPRESS_EXTENSIONS = (".html", ".svg", ".css", ".js", ".json")
+
+# compressed copies, by suffix, with .br only if brotli is installed
+COMPRESSED_SUFFIXES = (".gz", ".br")
+compressors = {".gz": functools.partial(gzip.compress, compresslevel=9, mtime=0)}
+if brotli is not None:
+    compressors[".br"] = functools.partial(brotli.compress, quality=11)
+
+SVG_NS = "http://www.w3.org/2000/svg"
+
+# Parsed map models, loaded once per run
+svg_models = {}
+
+# Reference the LPA geometry from a shared docs/map/ asset instead of inlining it
+shared_maps = False
+
+# Minify the templates and maps, and move static style blocks to shared stylesheets
+minify = False
+
+# Shared stylesheets, by their path in docs/, for style blocks moved out of templates
+stylesheets = {}
+
+# Page fingerprints from the last run, and those from this run
+previous_fingerprints = {}
+fingerprints = {}
+page_counts = {"written": 0, "unchanged": 0, "skipped": 0}
+
+# Fingerprints of this module and each template with those it extends or includes
+source_fingerprints = {}
+
+# Profile of each render function and page, recorded with --profile.
+# The running totals are snapshot at the start of each function and page,
+# and the difference at its end is added to its profile.
+# Map fragments are generated while a page is streamed, so their time is
+# counted under svg and taken out of the template time. Bytes are only
+# counted for pages written, not those found unchanged.
+PROFILE_METRICS = ["wall", "sql", "statements", "template", "svg", "bytes"]
+profiling = False
+profile = {"functions": {}, "pages": {}}
+profile_totals = dict.fromkeys(PROFILE_METRICS, 0)
+profile_page_start = {}
 
 # Award page legends
 AWARD_LEGENDS = [
@@ -131,24 +231,268 @@ def format_govuk_date(date_str):
         return date_str
 
 
+def template_fingerprint(env, name):
+    """Hash the source of a template and the templates it extends or includes."""
+    if name not in source_fingerprints:
+        source = env.loader.get_source(env, name)[0]
+        digest = hashlib.sha256(source.encode())
+        references = meta.find_referenced_templates(env.parse(source))
+        for reference in sorted(filter(None, references)):
+            digest.update(template_fingerprint(env, reference).encode())
+        source_fingerprints[name] = digest.hexdigest()
+    return source_fingerprints[name]
+
+
+def page_fingerprint(template, kwargs):
+    """Hash everything a page is rendered from: this code, the template chain,
+    and the rows and map SVG passed to the template."""
+    if __file__ not in source_fingerprints:
+        with open(__file__, "rb") as f:
+            source_fingerprints[__file__] = hashlib.sha256(f.read()).hexdigest()
+
+    digest = hashlib.sha256(source_fingerprints[__file__].encode())
+    digest.update(template_fingerprint(template.environment, template.name).encode())
+    digest.update(repr(sorted(kwargs.items())).encode())
+    return digest.hexdigest()
+
+
+def write_file(path, content):
+    """Write text, or an iterable of text, to a file, unless the file already
+    has exactly that content.
+
+    The content is compared with the file as it's generated, so nothing is
+    held in memory, and only once it differs is it written to a temporary
+    file, which is renamed over the file, and any compressed copies of the
+    file are removed, as they no longer match it.
+    Returns True if the file was written.
+    """
+    if isinstance(content, str):
+        content = [content]
+    chunks = (chunk.encode("utf-8") for chunk in content)
+
+    # the length of the prefix which matches the file, and the chunk after it
+    matched, pending = 0, b""
+    try:
+        with open(path, "rb") as f:
+            for data in chunks:
+                if f.read(len(data)) != data:
+                    pending = data
+                    break
+                matched += len(data)
+            else:
+                if not f.read(1):
+                    return False
+    except FileNotFoundError:
+        pass
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as out:
+            if matched:
+                with open(path, "rb") as f:
+                    out.write(f.read(matched))
+            out.write(pending)
+            for data in chunks:
+                out.write(data)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    for suffix in COMPRESSED_SUFFIXES:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return True
+
+
+def profile_snapshot():
+    """Take a snapshot of the running profile totals."""
+    return dict(profile_totals, wall=time.perf_counter())
+
+
+def profile_since(start):
+    """Get the profile metrics accumulated since a snapshot."""
+    end = profile_snapshot()
+    return {metric: end[metric] - start[metric] for metric in PROFILE_METRICS}
+
+
+def profile_add(profiles, key, metrics):
+    """Add metrics to an entry in the profile of functions or pages."""
+    entry = profiles.setdefault(key, dict.fromkeys(PROFILE_METRICS, 0))
+    for metric, value in metrics.items():
+        entry[metric] += value
+
+
+def profiled(metric):
+    """Decorate a function so the time spent in it is added to a profile metric."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiling:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile_totals[metric] += time.perf_counter() - start
+
+        return wrapper
+
+    return decorator
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """A cursor which adds the statements it runs, and their time, to the profile."""
+
+    def execute(self, *args):
+        profile_totals["statements"] += 1
+        return self.timed(super().execute, *args)
+
+    def executemany(self, *args):
+        profile_totals["statements"] += 1
+        return self.timed(super().executemany, *args)
+
+    def fetchone(self):
+        return self.timed(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self.timed(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self.timed(super().fetchall)
+
+    def timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            profile_totals["sql"] += time.perf_counter() - start
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """A connection whose cursors add their SQL to the profile."""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+
 def render(path, template, docs="docs/", **kwargs):
-    """Render a template to a file."""
+    """Render a template to a file, unless it's unchanged since the last run."""
     path = os.path.join(docs, path)
-    directory = os.path.dirname(path)
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-    with open(path, "w") as f:
-        print(f"creating {path}", file=sys.stderr)
-        f.write(template.render(BASE_PATH=BASE_PATH, **kwargs))
+    fingerprint = page_fingerprint(template, kwargs)
+    fingerprints[path] = fingerprint
+    if previous_fingerprints.get(path) == fingerprint and os.path.exists(path):
+        page_counts["skipped"] += 1
+    else:
+        # the page is streamed to its file as it's rendered
+        start = time.perf_counter()
+        svg = profile_totals["svg"]
+        stream = template.stream(BASE_PATH=BASE_PATH, **kwargs)
+        stream.enable_buffering(STREAM_BUFFER)
+        written = write_file(path, stream)
+        if profiling:
+            elapsed = time.perf_counter() - start
+            profile_totals["template"] += elapsed - (profile_totals["svg"] - svg)
+            if written:
+                profile_totals["bytes"] += os.path.getsize(path)
+
+        if written:
+            print(f"creating {path}", file=sys.stderr)
+            page_counts["written"] += 1
+        else:
+            page_counts["unchanged"] += 1
 
+    # a page's profile includes the queries and maps made for it since the last page
+    if profiling:
+        profile_add(profile["pages"], path, profile_since(profile_page_start))
+        profile_page_start.update(profile_snapshot())
 
-def get_db_connection():
+
+def get_db_connection(read_only=False):
     """Get database connection."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    factory = ProfiledConnection if profiling else sqlite3.Connection
+    if read_only:
+        conn = sqlite3.connect(
+            f"file:{DATABASE_PATH}?mode=ro", uri=True, factory=factory
+        )
+    else:
+        conn = sqlite3.connect(DATABASE_PATH, factory=factory)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def minify_css(css):
+    """Collapse the whitespace in a stylesheet."""
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};,])\s*", r"\1", css).strip()
+
+
+def share_style(match):
+    """Replace a static style block with a link to a shared stylesheet."""
+    css = match.group(1)
+    if "{{" in css or "{%" in css or "{#" in css:
+        return match.group(0)
+    css = minify_css(css) + "\n"
+    path = f"stylesheets/{hashlib.sha256(css.encode()).hexdigest()[:12]}.css"
+    stylesheets[path] = css
+    return f'<link rel="stylesheet" href="{BASE_PATH}/{path}">'
+
+
+def minify_template(source):
+    """Move the static style blocks in a template to shared stylesheets, and
+    collapse indentation and blank lines to a single newline."""
+    source = re.sub(r"<style>(.*?)</style>", share_style, source, flags=re.S)
+    return re.sub(r"\s*\n\s*", "\n", source)
+
+
+class MinifiedLoader(FileSystemLoader):
+    """Load templates minified, so they're compiled and cached that way."""
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        return minify_template(source), filename, uptodate
+
+
+def write_stylesheets(env, docs="docs/"):
+    """Write the shared stylesheets for the style blocks moved out of templates."""
+    for name in env.list_templates():
+        env.loader.get_source(env, name)
+    for path, css in sorted(stylesheets.items()):
+        path = os.path.join(docs, path)
+        if write_file(path, css):
+            print(f"creating {path}", file=sys.stderr)
+
+
+def get_environment():
+    """Get the Jinja environment with custom filters."""
+    # compiled templates are cached by the hash of their source between runs,
+    # and the templates don't change during a run, so aren't checked for reloading
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    loader = MinifiedLoader if minify else FileSystemLoader
+    env = Environment(
+        loader=loader("templates/"),
+        bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+        auto_reload=False,
+    )
+
+    # Add custom filters
+    env.filters["urlencode"] = lambda s: quote(str(s), safe="")
+    env.filters["slugify"] = lambda s: str(s).replace("/", "-")
+    env.filters["govuk_date"] = lambda s: format_govuk_date(s)
+    return env
+
+
+def sharded(items, shard=None):
+    """Select the items for a shard, given as (index, count), of a section."""
+    if shard is None:
+        return items
+    index, count = shard
+    return items[index::count]
+
+
 def render_index(env, conn):
     """Render index page."""
     template = env.get_template("index.html")
@@ -175,7 +519,7 @@ def render_organisation_index(env, conn):
         FROM organisations o
         LEFT JOIN awards a ON o.organisation = a.organisation
         GROUP BY o.organisation
-        ORDER BY o.name
+        ORDER BY o.name, o.organisation
     """
     )
 
@@ -197,7 +541,7 @@ def render_organisation_index(env, conn):
             FROM awards a
             JOIN interventions i ON a.intervention = i.intervention
             WHERE a.organisation = ?
-            ORDER BY i.name
+            ORDER BY i.name, i.intervention
         """,
             (org["organisation"],),
         )
@@ -219,119 +563,99 @@ def render_organisation_index(env, conn):
     )
 
 
-def render_organisations(env, conn):
-    """Render individual organisation pages."""
+def group_rows(cursor, key):
+    """Group the rows of an executed query into lists of dicts by a column."""
+    groups = {}
+    for row in cursor.fetchall():
+        row = dict(row)
+        groups.setdefault(row[key], []).append(row)
+    return groups
+
+
+def fetch_organisation_relations(conn):
+    """Fetch the projects, adoptions, awards, quality and partners for every
+    organisation with one query per relation, grouped by organisation."""
     cursor = conn.cursor()
+    relations = {}
 
-    cursor.execute("SELECT * FROM organisations")
-    organisations = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT po.organisation, p.project, p.name
+        FROM project_organisations po
+        JOIN projects p ON po.project = p.project
+        ORDER BY po.organisation, po.project
+    """
+    )
+    relations["projects"] = group_rows(cursor, "organisation")
 
-    for org_row in organisations:
-        org = dict(org_row)
-        organisation_id = org["organisation"]
+    cursor.execute(
+        """
+        SELECT *
+        FROM adoptions
+        ORDER BY start_date ASC, id
+    """
+    )
+    relations["adoptions"] = group_rows(cursor, "organisation")
 
-        # Get projects
-        cursor.execute(
-            """
-            SELECT p.project, p.name
-            FROM project_organisations po
-            JOIN projects p ON po.project = p.project
-            WHERE po.organisation = ?
-        """,
-            (organisation_id,),
-        )
-        projects = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(
+        """
+        SELECT a.organisation, a.award, a.start_date, a.fund, a.intervention, a.amount,
+               i.name as intervention_name, f.name as fund_name
+        FROM awards a
+        JOIN interventions i ON a.intervention = i.intervention
+        JOIN funds f ON a.fund = f.fund
+        ORDER BY a.start_date ASC, a.rowid
+    """
+    )
+    relations["awards"] = group_rows(cursor, "organisation")
 
-        # Get adoptions
-        cursor.execute(
-            """
-            SELECT *
-            FROM adoptions
-            WHERE organisation = ?
-            ORDER BY start_date ASC
-        """,
-            (organisation_id,),
-        )
-        adoptions = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(
+        """
+        SELECT organisation, dataset, status
+        FROM quality
+        WHERE status != ''
+        ORDER BY organisation, dataset
+    """
+    )
+    relations["quality"] = group_rows(cursor, "organisation")
 
-        # Get awards
-        cursor.execute(
-            """
-            SELECT a.award, a.start_date, a.fund, a.intervention, a.amount,
-                   i.name as intervention_name, f.name as fund_name
-            FROM awards a
-            JOIN interventions i ON a.intervention = i.intervention
-            JOIN funds f ON a.fund = f.fund
-            WHERE a.organisation = ?
-            ORDER BY a.start_date ASC
-        """,
-            (organisation_id,),
-        )
-        awards = [dict(row) for row in cursor.fetchall()]
+    # Partnerships are bidirectional: each organisation on an award
+    # is a partner of every other organisation on the award
+    cursor.execute(
+        """
+        SELECT ao.organisation AS member, o.organisation, o.name,
+               COUNT(DISTINCT ao.award) AS shared_count
+        FROM award_organisations ao
+        JOIN award_organisations p
+          ON p.award = ao.award AND p.organisation != ao.organisation
+        JOIN organisations o ON p.organisation = o.organisation
+        GROUP BY ao.organisation, o.organisation
+        ORDER BY ao.organisation, shared_count DESC, o.name, o.organisation
+    """
+    )
+    relations["partners"] = group_rows(cursor, "member")
 
-        # Get quality data
-        cursor.execute(
-            """
-            SELECT dataset, status
-            FROM quality
-            WHERE organisation = ? AND status != ''
-        """,
-            (organisation_id,),
-        )
-        quality = [dict(row) for row in cursor.fetchall()]
+    return relations
 
-        # Get partner organisations - partnerships are bidirectional
-        # 1. Get awards where this org is the main recipient (has partners in organisations)
-        # 2. Get awards where this org is in the organisations (partner to another org)
 
-        cursor.execute(
-            """
-            SELECT award, organisation, organisations
-            FROM awards
-            WHERE organisation = ? OR organisations LIKE ?
-        """,
-            (organisation_id, f"%{organisation_id}%"),
-        )
-        award_rows = cursor.fetchall()
-
-        # Parse partner organisations from awards
-        partner_counts = {}
-        for row in award_rows:
-            # Collect all organisations in this award
-            all_orgs = [row["organisation"]]
-            if row["organisations"]:
-                all_orgs.extend(
-                    [
-                        org.strip()
-                        for org in row["organisations"].split(";")
-                        if org.strip()
-                    ]
-                )
+def render_organisations(env, conn, shard=None):
+    """Render individual organisation pages."""
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT * FROM organisations")
+    organisations = cursor.fetchall()
 
-            # Add each org (except ourselves) as a partner
-            for org_id in all_orgs:
-                if org_id and org_id != organisation_id:
-                    partner_counts[org_id] = partner_counts.get(org_id, 0) + 1
+    relations = fetch_organisation_relations(conn)
 
-        # Get partner organisation details
-        partners = []
-        for partner_id, count in partner_counts.items():
-            cursor.execute(
-                "SELECT organisation, name FROM organisations WHERE organisation = ?",
-                (partner_id,),
-            )
-            partner_row = cursor.fetchone()
-            if partner_row:
-                partners.append(
-                    {
-                        "organisation": partner_row["organisation"],
-                        "name": partner_row["name"],
-                        "shared_count": count,
-                    }
-                )
+    for org_row in sharded(organisations, shard):
+        org = dict(org_row)
+        organisation_id = org["organisation"]
 
-        # Sort by count descending, then by name
-        partners.sort(key=lambda x: (-x["shared_count"], x["name"]))
+        projects = relations["projects"].get(organisation_id, [])
+        adoptions = relations["adoptions"].get(organisation_id, [])
+        awards = relations["awards"].get(organisation_id, [])
+        quality = relations["quality"].get(organisation_id, [])
+        partners = relations["partners"].get(organisation_id, [])
 
         # Generate maps for this organisation if it has awards
         shapes_svg = ""
@@ -365,14 +689,14 @@ def render_organisations(env, conn):
         )
 
 
-def render_projects(env, conn):
+def render_projects(env, conn, shard=None):
     """Render individual project pages."""
     cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM projects")
     projects = cursor.fetchall()
 
-    for proj_row in projects:
+    for proj_row in sharded(projects, shard):
         project = dict(proj_row)
         project_id = project["project"]
 
@@ -385,16 +709,26 @@ def render_projects(env, conn):
             LEFT JOIN awards a ON o.organisation = a.organisation
             WHERE po.project = ?
             GROUP BY o.organisation
-            ORDER BY o.name
+            ORDER BY o.name, o.organisation
         """,
             (project_id,),
         )
         organisations = [dict(row) for row in cursor.fetchall()]
 
-        # Get interventions for each organisation and calculate buckets
+        # Get interventions for each organisation and count buckets
         counts = {legend["reference"]: 0 for legend in AWARD_LEGENDS}
         total = 0
 
+        cursor.execute(
+            """
+            SELECT organisation, bucket
+            FROM organisation_buckets
+            WHERE scope = 'project' AND scope_value = ?
+        """,
+            (project_id,),
+        )
+        org_buckets = {row["organisation"]: row["bucket"] for row in cursor.fetchall()}
+
         for org in organisations:
             # Get interventions for this organisation
             cursor.execute(
@@ -404,24 +738,16 @@ def render_projects(env, conn):
                 JOIN interventions i ON a.intervention = i.intervention
                 JOIN project_organisations po ON a.organisation = po.organisation
                 WHERE a.organisation = ? AND po.project = ?
-                ORDER BY i.name
+                ORDER BY i.name, i.intervention
             """,
                 (org["organisation"], project_id),
             )
             interventions = [dict(row) for row in cursor.fetchall()]
             org["interventions"] = interventions
 
-            # Calculate bucket if organisation has awards
+            # Count the bucket if organisation has awards
             if interventions:
-                intervention_ids = set(i["intervention"] for i in interventions)
-                buckets = set()
-                if intervention_ids & set(["innovation", "engagement"]):
-                    buckets.add("PropTech")
-                if intervention_ids & set(["software", "integration", "improvement"]):
-                    buckets.add("Software")
-                if intervention_ids & set(["plan-making"]):
-                    buckets.add("Plan-making")
-                bucket = "_".join(sorted(list(buckets)))
+                bucket = org_buckets.get(org["organisation"], "")
                 if bucket:
                     counts[bucket] = counts.get(bucket, 0) + 1
                     total += 1
@@ -542,7 +868,7 @@ def render_projects(env, conn):
         )
 
 
-def render_products(env, conn):
+def render_products(env, conn, shard=None):
     """Render individual product pages."""
     from datetime import datetime, timedelta
 
@@ -552,7 +878,7 @@ def render_products(env, conn):
     cursor.execute("SELECT * FROM products")
     products = cursor.fetchall()
 
-    for prod_row in products:
+    for prod_row in sharded(products, shard):
         product = dict(prod_row)
         product_id = product["product"]
 
@@ -566,72 +892,23 @@ def render_products(env, conn):
             FROM adoptions a
             JOIN organisations o ON a.organisation = o.organisation
             WHERE a.product = ?
-            ORDER BY a.start_date ASC
+            ORDER BY a.start_date ASC, a.id
         """,
             (product_id,),
         )
         adoptions = [dict(row) for row in cursor.fetchall()]
 
-        # Calculate funnel counts
-        counts = {}
-        cursor.execute(
-            "SELECT COUNT(*) FROM organisations WHERE role = 'local-planning-authority'"
-        )
-        counts["lpa"] = cursor.fetchone()[0]
-
-        cursor.execute(
-            """
-            SELECT COUNT(*) FROM organisations
-            WHERE role = 'local-planning-authority'
-            AND (end_date IS NULL OR end_date = '' OR end_date > date('now'))
-        """
-        )
-        counts["active_lpa"] = cursor.fetchone()[0]
-
-        cursor.execute(
-            "SELECT COUNT(DISTINCT organisation) FROM project_organisations WHERE project = 'open-digital-planning'"
-        )
-        counts["odp"] = cursor.fetchone()[0]
-
-        cursor.execute(
-            "SELECT COUNT(DISTINCT organisation) FROM organisations WHERE amount > 0"
-        )
-        counts["funded"] = cursor.fetchone()[0]
-
-        cursor.execute(
-            "SELECT COUNT(DISTINCT organisation) FROM organisations WHERE software_amount > 0"
-        )
-        counts["software"] = cursor.fetchone()[0]
-
-        cursor.execute(
-            "SELECT COUNT(DISTINCT organisation) FROM organisations WHERE data_score >= 4 AND data_score < 100"
-        )
-        counts["providing"] = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM organisations WHERE data_ready = 1")
-        counts["data_ready"] = cursor.fetchone()[0]
-
-        cursor.execute(
-            """
-            SELECT COUNT(DISTINCT o.organisation)
-            FROM organisations o
-            JOIN adoptions a ON o.organisation = a.organisation
-            WHERE a.product = ? AND a.adoption_status IN ('interested', 'adopting')
-        """,
-            (product_id,),
-        )
-        counts["interested_or_adopting"] = cursor.fetchone()[0]
-
+        # Funnel counts, summarised by bin/load-data.py
         cursor.execute(
             """
-            SELECT COUNT(DISTINCT o.organisation)
-            FROM organisations o
-            JOIN adoptions a ON o.organisation = a.organisation
-            WHERE a.product = ? AND a.adoption_status = 'live'
+            SELECT lpa, active_lpa, odp, funded, software, providing, data_ready,
+                   interested_or_adopting, live
+            FROM product_funnel
+            WHERE product = ?
         """,
             (product_id,),
         )
-        counts["live"] = cursor.fetchone()[0]
+        counts = dict(cursor.fetchone())
 
         # Get timeline data (live adoptions only)
         cursor.execute(
@@ -691,7 +968,7 @@ def render_products(env, conn):
             FROM organisations o
             LEFT JOIN adoptions a ON o.organisation = a.organisation AND a.product = ?
             WHERE o.amount > 0 AND o.bucket != ''
-            ORDER BY o.score DESC
+            ORDER BY o.score DESC, o.organisation, a.adoption_status
         """,
             (product_id,),
         )
@@ -771,7 +1048,7 @@ def render_product_index(env, conn):
         FROM products p
         LEFT JOIN adoptions a ON p.product = a.product
         GROUP BY p.product
-        ORDER BY p.name
+        ORDER BY p.name, p.product
     """
     )
 
@@ -800,7 +1077,7 @@ def render_project_index(env, conn):
         FROM projects p
         LEFT JOIN project_organisations po ON p.project = po.project
         GROUP BY p.project
-        ORDER BY p.name
+        ORDER BY p.name, p.project
     """
     )
 
@@ -820,13 +1097,10 @@ def render_intervention_index(env, conn):
     cursor.execute(
         """
         SELECT i.intervention, i.name, i.description,
-               COUNT(a.award) as award_count,
-               COUNT(DISTINCT a.organisation) as organisation_count,
-               COALESCE(SUM(a.amount), 0) as total_amount
+               t.award_count, t.organisation_count, t.total_amount
         FROM interventions i
-        LEFT JOIN awards a ON i.intervention = a.intervention
-        GROUP BY i.intervention
-        ORDER BY i.name
+        JOIN intervention_totals t ON i.intervention = t.intervention
+        ORDER BY i.name, i.intervention
     """
     )
 
@@ -843,14 +1117,14 @@ def render_intervention_index(env, conn):
     )
 
 
-def render_interventions(env, conn):
+def render_interventions(env, conn, shard=None):
     """Render individual intervention pages."""
     cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM interventions")
     interventions = cursor.fetchall()
 
-    for int_row in interventions:
+    for int_row in sharded(interventions, shard):
         intervention = dict(int_row)
         intervention_id = intervention["intervention"]
 
@@ -864,7 +1138,7 @@ def render_interventions(env, conn):
             JOIN organisations o ON a.organisation = o.organisation
             JOIN funds f ON a.fund = f.fund
             WHERE a.intervention = ?
-            ORDER BY a.start_date ASC
+            ORDER BY a.start_date ASC, a.rowid
         """,
             (intervention_id,),
         )
@@ -880,7 +1154,7 @@ def render_interventions(env, conn):
             FROM awards a
             JOIN organisations o ON a.organisation = o.organisation
             WHERE a.intervention = ?
-            ORDER BY o.name
+            ORDER BY o.name, o.organisation
         """,
             (intervention_id,),
         )
@@ -921,12 +1195,10 @@ def render_fund_index(env, conn):
     cursor.execute(
         """
         SELECT f.fund, f.name, f.description, f.start_date,
-               COUNT(a.award) as award_count,
-               COALESCE(SUM(a.amount), 0) as total_amount
+               t.award_count, t.total_amount
         FROM funds f
-        LEFT JOIN awards a ON f.fund = a.fund
-        GROUP BY f.fund
-        ORDER BY f.start_date ASC
+        JOIN fund_totals t ON f.fund = t.fund
+        ORDER BY f.start_date ASC, f.fund
     """
     )
 
@@ -940,46 +1212,18 @@ def render_fund_index(env, conn):
             FROM awards a
             JOIN interventions i ON a.intervention = i.intervention
             WHERE a.fund = ?
-            ORDER BY i.name
+            ORDER BY i.name, i.intervention
         """,
             (fund["fund"],),
         )
         interventions = cursor.fetchall()
         fund["interventions"] = [dict(row) for row in interventions]
 
-    # Calculate summary statistics
-    summary = {}
-
-    # Number of funds
-    summary["fund_count"] = len(funds)
-
-    # Number of awards
-    cursor.execute("SELECT COUNT(*) as count FROM awards")
-    summary["award_count"] = cursor.fetchone()["count"]
-
-    # Total amount awarded
-    cursor.execute("SELECT COALESCE(SUM(amount), 0) as total FROM awards")
-    summary["total_amount"] = cursor.fetchone()["total"]
-
-    # Number of organisations directly awarded funding
-    cursor.execute("SELECT COUNT(DISTINCT organisation) as count FROM awards")
-    summary["direct_orgs"] = cursor.fetchone()["count"]
-
-    # Number of organisations awarded funding through partnerships
+    # Summary statistics, from bin/load-data.py
     cursor.execute(
-        """
-        SELECT organisations FROM awards
-        WHERE organisations IS NOT NULL AND organisations != ''
-        """
+        "SELECT award_count, total_amount, direct_orgs, partner_orgs FROM award_totals"
     )
-    partner_orgs = set()
-    for row in cursor.fetchall():
-        if row["organisations"]:
-            partners = [
-                p.strip() for p in row["organisations"].split(";") if p.strip()
-            ]
-            partner_orgs.update(partners)
-    summary["partner_orgs"] = len(partner_orgs)
+    summary = {"fund_count": len(funds), **dict(cursor.fetchone())}
 
     breadcrumbs = [{"text": "Fund"}]
 
@@ -993,14 +1237,14 @@ def render_fund_index(env, conn):
     )
 
 
-def render_funds(env, conn):
+def render_funds(env, conn, shard=None):
     """Render individual fund pages."""
     cursor = conn.cursor()
 
     cursor.execute("SELECT * FROM funds")
     funds = cursor.fetchall()
 
-    for fund_row in funds:
+    for fund_row in sharded(funds, shard):
         fund = dict(fund_row)
         fund_id = fund["fund"]
 
@@ -1014,7 +1258,7 @@ def render_funds(env, conn):
             JOIN organisations o ON a.organisation = o.organisation
             JOIN interventions i ON a.intervention = i.intervention
             WHERE a.fund = ?
-            ORDER BY a.start_date ASC
+            ORDER BY a.start_date ASC, a.rowid
         """,
             (fund_id,),
         )
@@ -1030,7 +1274,7 @@ def render_funds(env, conn):
             FROM awards a
             JOIN organisations o ON a.organisation = o.organisation
             WHERE a.fund = ?
-            ORDER BY o.name
+            ORDER BY o.name, o.organisation
         """,
             (fund_id,),
         )
@@ -1064,6 +1308,7 @@ def radius(amount):
     return sqrt(float(amount) / pi) / 25
 
 
+@profiled("svg")
 def generate_treemap_svg(funded_orgs, totals, width=1200, height=600):
     """Generate a treemap SVG from hierarchical data.
 
@@ -1303,158 +1548,682 @@ def squarify_layout(items, x, y, width, height):
     return squarify_recursive(sorted_items, x, y, width, height)
 
 
-def process_points_svg(conn, filter_type=None, filter_value=None):
-    """Process point.svg to add award circles.
+def load_points_svg(conn, path=POINTS_SVG_PATH):
+    """Parse point.svg into a map model, once per run.
 
-    Args:
-        conn: Database connection
-        filter_type: Optional filter type ('fund', 'intervention', 'project', 'organisation')
-        filter_value: Optional filter value (e.g., fund ID)
+    Returns a dict with the header (including the scale legend), the circles
+    keyed by LPA id, the footer, and the LPA id for each organisation,
+    or None if the SVG hasn't been downloaded.
     """
-    cursor = conn.cursor()
+    if not os.path.exists(path):
+        return None
 
-    # Get awards with organisation data, optionally filtered
-    if filter_type == "fund":
-        cursor.execute(
-            """
-            SELECT a.award, a.intervention, a.amount, a.organisation,
-                   o.local_planning_authority, o.entity
-            FROM awards a
-            JOIN organisations o ON a.organisation = o.organisation
-            WHERE a.fund = ?
-        """,
-            (filter_value,),
-        )
-    elif filter_type == "intervention":
-        cursor.execute(
-            """
-            SELECT a.award, a.intervention, a.amount, a.organisation,
-                   o.local_planning_authority, o.entity
-            FROM awards a
-            JOIN organisations o ON a.organisation = o.organisation
-            WHERE a.intervention = ?
-        """,
-            (filter_value,),
-        )
-    elif filter_type == "project":
-        cursor.execute(
-            """
-            SELECT a.award, a.intervention, a.amount, a.organisation,
-                   o.local_planning_authority, o.entity
-            FROM awards a
-            JOIN organisations o ON a.organisation = o.organisation
-            JOIN project_organisations po ON a.organisation = po.organisation
-            WHERE po.project = ?
-        """,
-            (filter_value,),
-        )
-    elif filter_type == "organisation":
-        cursor.execute(
-            """
-            SELECT a.award, a.intervention, a.amount, a.organisation,
-                   o.local_planning_authority, o.entity
-            FROM awards a
-            JOIN organisations o ON a.organisation = o.organisation
-            WHERE a.organisation = ?
-        """,
-            (filter_value,),
-        )
-    else:
-        cursor.execute(
-            """
-            SELECT a.award, a.intervention, a.amount, a.organisation,
-                   o.local_planning_authority, o.entity
-            FROM awards a
-            JOIN organisations o ON a.organisation = o.organisation
+    cursor = conn.cursor()
+    cursor.execute(
         """
-        )
+        SELECT organisation, local_planning_authority
+        FROM organisations
+        WHERE local_planning_authority != ''
+    """
+    )
+    areas = {row["organisation"]: row["local_planning_authority"] for row in cursor}
 
-    awards_data = cursor.fetchall()
-
-    # Build circle lookup by area
-    circles = {}
     re_id = re.compile(r"id=\"(?P<id>\w+)")
+    header = []
+    footer = []
+    circles = {}
+    first = True
 
-    svg_path = "var/cache/point.svg"
-    if not os.path.exists(svg_path):
-        return ""
-
-    with open(svg_path) as f:
-        for line in f.readlines():
+    with open(path) as f:
+        for line in f:
             if "<circle" in line:
                 match = re_id.search(line)
                 if match:
-                    area = match.group("id")
-                    circles[area] = line
+                    circles[match.group("id")] = line
+                first = False
+                continue
+
+            output = header if first else footer
+            if "<svg" in line:
+                line = line.replace("455", "465")
+            output.append(line)
+            if "<svg" in line:
+                # Add scale legend
+                r100k = radius(100000)
+                r500k = radius(500000)
+                r1m = radius(1000000)
+                y100k = 100 - r100k
+                y500k = 100 - r500k
+                y1m = 100 - r1m
+                output.append(
+                    f'<circle cx="50" cy="{y1m}" r="{r1m}" /><text x="75" y="62.5" class="key" style="font-size: 11px">£1m</text>\n'
+                )
+                output.append(
+                    f'<circle cx="50" cy="{y500k}" r="{r500k}" /><text x="75" y="81" class="key" style="font-size: 11px">£500k</text>\n'
+                )
+                output.append(
+                    f'<circle cx="50" cy="{y100k}" r="{r100k}" /><text x="75" y="100" class="key" style="font-size: 11px">£100k</text>\n'
+                )
+
+    return {
+        "header": "".join(header),
+        "circles": circles,
+        "footer": "".join(footer),
+        "areas": areas,
+    }
+
 
-    # Get organisations to map LPA to areas
+def load_shapes_svg(conn, path=SHAPES_SVG_PATH):
+    """Parse local-planning-authority.svg into a map model, once per run.
+
+    The links and titles for each area don't change between pages, so are
+    applied here. Returns a dict with the header, the footer, and the shapes
+    between them as a list of fixed text or (lpa, head, tail) tuples where
+    a page's bucket class goes between the head and tail,
+    or None if the SVG hasn't been downloaded.
+    """
+    if not os.path.exists(path):
+        return None
+
+    # Get ALL organisations with LPA codes for linking all shapes
+    cursor = conn.cursor()
     cursor.execute(
         """
-        SELECT organisation, local_planning_authority, entity
+        SELECT organisation, local_planning_authority, name
         FROM organisations
         WHERE local_planning_authority != ''
-    """
+        """
     )
-    org_areas = {}
+    all_lpa_orgs = {}
     for row in cursor.fetchall():
-        org_areas[row["organisation"]] = {
-            "lpa": row["local_planning_authority"],
-            "entity": row["entity"],
+        all_lpa_orgs[row["local_planning_authority"]] = {
+            "organisation": row["organisation"],
+            "name": row["name"],
         }
 
-    # Build award circles
-    award_circles = []
-    for award_row in awards_data:
-        org = award_row["organisation"]
-        intervention = award_row["intervention"]
-        amount = award_row["amount"]
+    re_id = re.compile(r"id=\"(?P<lpa>\w+)")
+    found = set()
+    current_lpa = ""
+    current_name = ""
 
-        if org not in org_areas:
-            continue
+    parts = []
+    with open(path) as f:
+        for line in f:
+            if "<svg" in line:
+                line = line.replace("455", "465")
+            line = line.replace(' fill-rule="evenodd"', "")
+            line = line.replace('class="polygon ', 'class="')
 
-        lpa = org_areas[org]["lpa"]
-        if lpa in circles:
-            line = circles[lpa]
-            r = radius(amount)
-            line = line.replace('r="1"', f'r="{r:.2f}"')
-            line = line.replace('class="point"', f'class="{intervention}"')
-            award_circles.append(line)
+            match = re_id.search(line)
+            if match:
+                lpa = match.group("lpa")
+                if lpa in found:
+                    print(f"already found {lpa}", file=sys.stderr)
+                if lpa not in all_lpa_orgs:
+                    current_lpa = ""
+                    current_name = ""
+                else:
+                    found.add(lpa)
+                    current_lpa = lpa
+                    current_name = all_lpa_orgs[lpa]["name"]
 
-    # Build final SVG
-    output = []
-    first = True
-    with open(svg_path) as f:
-        for line in f.readlines():
-            if "<circle" in line:
-                if first:
-                    for circle_line in award_circles:
-                        output.append(circle_line)
-                    first = False
-            else:
-                if "<svg" in line:
-                    line = line.replace("455", "465")
-                output.append(line)
-                if "<svg" in line:
-                    # Add scale legend
-                    r100k = radius(100000)
-                    r500k = radius(500000)
-                    r1m = radius(1000000)
-                    y100k = 100 - r100k
-                    y500k = 100 - r500k
-                    y1m = 100 - r1m
-                    output.append(
-                        f'<circle cx="50" cy="{y1m}" r="{r1m}" /><text x="75" y="62.5" class="key" style="font-size: 11px">£1m</text>\n'
+            if 'class="local-planning-authority"' in line:
+                # Only add link if we have a valid organisation
+                if current_lpa:
+                    org_link = (
+                        f"/organisation/{all_lpa_orgs[current_lpa]['organisation']}/"
+                    )
+                    line = line.replace(
+                        "<path", f'<a href="{BASE_PATH}{org_link}"><path'
                     )
-                    output.append(
-                        f'<circle cx="50" cy="{y500k}" r="{r500k}" /><text x="75" y="81" class="key" style="font-size: 11px">£500k</text>\n'
+                    line = line.replace(
+                        'class="local-planning-authority"/>',
+                        f'class="local-planning-authority \0"><title>{current_name}</title></path></a>',
                     )
-                    output.append(
-                        f'<circle cx="50" cy="{y100k}" r="{r100k}" /><text x="75" y="100" class="key" style="font-size: 11px">£100k</text>\n'
+                else:
+                    # No link for areas not in database
+                    line = line.replace(
+                        'class="local-planning-authority"/>',
+                        f'class="local-planning-authority "><title>{current_name}</title></path>',
                     )
 
+                if "\0" in line:
+                    head, tail = line.split("\0", 1)
+                    parts.append((current_lpa, head, tail))
+                    continue
+
+            if parts and isinstance(parts[-1], str):
+                parts[-1] += line
+            else:
+                parts.append(line)
+
+    header = parts.pop(0) if parts and isinstance(parts[0], str) else ""
+    footer = parts.pop() if parts and isinstance(parts[-1], str) else ""
+
+    return {"header": header, "shapes": parts, "footer": footer}
+
+
+def load_shared_shapes_svg(
+    conn, path=SHAPES_SVG_PATH, asset_path="map/local-planning-authority.svg"
+):
+    """Build the LPA geometry as a shared asset, and a map model which
+    references each shape with <use> instead of copying its path data.
+
+    The model has the same form as the one from load_shapes_svg,
+    with the text of the asset added.
+    """
+    if not os.path.exists(path):
+        return None
+
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT organisation, local_planning_authority, name
+        FROM organisations
+        WHERE local_planning_authority != ''
+        """
+    )
+    all_lpa_orgs = {}
+    for row in cursor.fetchall():
+        all_lpa_orgs[row["local_planning_authority"]] = {
+            "organisation": row["organisation"],
+            "name": row["name"],
+        }
+
+    ET.register_namespace("", SVG_NS)
+    root = ET.parse(path).getroot()
+    view_box = root.get("viewBox", "").replace("455", "465")
+    transform = root.find(f"{{{SVG_NS}}}g").get("transform", "")
+    layer = root.find(f".//{{{SVG_NS}}}g[@id='local-planning-authority']")
+
+    # Strip styling so each shape takes its fill from the page's <use> element
+    for defs in root.findall(f"{{{SVG_NS}}}defs"):
+        root.remove(defs)
+    for element in root.iter():
+        element.attrib.pop("class", None)
+        element.attrib.pop("fill-rule", None)
+
+    asset = ET.tostring(root, encoding="unicode") + "\n"
+    version = hashlib.sha256(asset.encode()).hexdigest()[:8]
+
+    href = f"{BASE_PATH}/{asset_path}?v={version}"
+    shapes = []
+    for element in layer:
+        lpa = element.get("id")
+        if not lpa:
+            continue
+        use = f'<use href="{href}#{lpa}" class="local-planning-authority '
+        if lpa in all_lpa_orgs:
+            org_link = f"/organisation/{all_lpa_orgs[lpa]['organisation']}/"
+            shapes.append(
+                (
+                    lpa,
+                    f'      <a href="{BASE_PATH}{org_link}">{use}',
+                    f'"><title>{all_lpa_orgs[lpa]["name"]}</title></use></a>\n',
+                )
+            )
+        else:
+            shapes.append(f'      {use}"><title></title></use>\n')
+
+    header = (
+        f'<svg xmlns="{SVG_NS}" baseProfile="full" viewBox="{view_box}">\n'
+        f'  <g transform="{transform}">\n'
+        '    <g class="name reference">\n'
+    )
+    footer = "    </g>\n  </g>\n</svg>\n"
+
+    return {"header": header, "shapes": shapes, "footer": footer, "asset": asset}
+
+
+def shared_map_path(level):
+    """The path in docs/ of the shared map asset for a level of detail."""
+    if level == "full":
+        return "map/local-planning-authority.svg"
+    return f"map/local-planning-authority-{level}.svg"
+
+
+def write_shared_maps(conn, docs="docs/"):
+    """Write the shared map asset referenced by each page's shapes map,
+    at each level of detail used."""
+    for level in sorted(set(map_detail.values())):
+        svg = svg_model("shapes", conn, level)
+        if svg is None:
+            return
+        path = os.path.join(docs, shared_map_path(level))
+        if write_file(path, svg["asset"]):
+            print(f"creating {path}", file=sys.stderr)
+
+
+def svg_model(name, conn, level="full"):
+    """Get a parsed map model, loading it on first use.
+
+    The shapes are loaded separately for each level of detail.
+    """
+    key = (name, level)
+    if key not in svg_models:
+        if name == "points":
+            svg = load_points_svg(conn)
+        elif shared_maps:
+            svg = load_shared_shapes_svg(
+                conn, simplified_svg(level), shared_map_path(level)
+            )
+        else:
+            svg = load_shapes_svg(conn, simplified_svg(level))
+        if svg is not None and minify:
+            svg = minify_model(svg)
+        if svg is not None:
+            svg["fingerprint"] = hashlib.sha256(repr(svg).encode()).hexdigest()
+        svg_models[key] = svg
+    return svg_models[key]
+
+
+def path_number(value, precision):
+    """Format a path coordinate in as few characters as possible."""
+    text = f"{value:.{precision}f}".rstrip("0").rstrip(".")
+    if text in ("", "-0"):
+        return "0"
+    return re.sub(r"^(-?)0\.", r"\1.", text)
+
+
+def append_path_number(output, value):
+    """Add a number to path data, only separated by a space where it'd run
+    into the one before."""
+    previous = output[-1]
+    if (
+        previous.isalpha()
+        or value.startswith("-")
+        or (value.startswith(".") and "." in previous)
+    ):
+        output.append(value)
+    else:
+        output.append(" " + value)
+
+
+def minify_path(d, precision=PATH_PRECISION):
+    """Round the coordinates in path data.
+
+    Relative coordinates are taken from the rounded position rather than
+    the exact one, so the rounding doesn't accumulate along a path.
+    Path data which can't be parsed is returned as it is.
+    """
+    tokens = path_tokens.findall(d)
+    output = []
+    x = y = rx = ry = 0.0
+    start = (x, y, rx, ry)
+    command = None
+    i = 0
+    try:
+        while i < len(tokens):
+            if tokens[i].isalpha():
+                command = tokens[i]
+                output.append(command)
+                i += 1
+                if command in "Zz":
+                    x, y, rx, ry = start
+                continue
+
+            # each segment of the command, repeated while there are numbers
+            relative = command.islower()
+            kind = command.lower()
+            args = [float(token) for token in tokens[i : i + path_arity[kind]]]
+            i += path_arity[kind]
+            if len(args) < path_arity[kind]:
+                return d
+
+            if kind == "h":
+                axes = ["x"]
+            elif kind == "v":
+                axes = ["y"]
+            elif kind == "a":
+                axes = [None] * 5 + ["x", "y"]
+            else:
+                axes = ["x", "y"] * (len(args) // 2)
+
+            values = []
+            ex, ey, rex, rey = x, y, rx, ry
+            for axis, value in zip(axes, args):
+                if axis == "x":
+                    ex = x + value if relative else value
+                    rex = round(ex, precision)
+                    value = rex - rx if relative else rex
+                elif axis == "y":
+                    ey = y + value if relative else value
+                    rey = round(ey, precision)
+                    value = rey - ry if relative else rey
+                values.append(path_number(value, precision))
+            x, y, rx, ry = ex, ey, rex, rey
+
+            if kind == "m" and output[-1] in "Mm":
+                start = (x, y, rx, ry)
+
+            for value in values:
+                append_path_number(output, value)
+    except (KeyError, ValueError, AttributeError):
+        return d
     return "".join(output)
 
 
+def minify_markup(text):
+    """Remove the whitespace between tags, and round the coordinates of paths."""
+    text = re.sub(r">\s+<", "><", text)
+    text = re.sub(r"^\s+(?=<)", "", text)
+    text = re.sub(r"(?<=>)\s+$", "", text)
+    return re.sub(r'\bd="([^"]*)"', lambda m: f'd="{minify_path(m.group(1))}"', text)
+
+
+def path_rings(d):
+    """Parse path data made of straight lines into rings of absolute points.
+
+    Returns None for path data with curves, which isn't simplified.
+    """
+    tokens = path_tokens.findall(d)
+    rings = []
+    x = y = 0.0
+    command = None
+    closed = True
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in "Zz" and rings:
+                x, y = rings[-1][0]
+                closed = True
+            elif command in "Mm":
+                closed = True
+            continue
+
+        kind = command.lower()
+        if kind not in "mlhv":
+            return None
+        relative = command.islower()
+        args = [float(token) for token in tokens[i : i + path_arity[kind]]]
+        i += path_arity[kind]
+        previous = (x, y)
+
+        if kind == "h":
+            x = x + args[0] if relative else args[0]
+        elif kind == "v":
+            y = y + args[0] if relative else args[0]
+        else:
+            x, y = (x + args[0], y + args[1]) if relative else tuple(args)
+
+        # a moveto, or anything after a closepath, starts a ring
+        if closed:
+            rings.append([])
+            closed = False
+            if kind != "m":
+                rings[-1].append(previous)
+        rings[-1].append((x, y))
+    return rings
+
+
+def douglas_peucker(points, tolerance):
+    """Simplify a line with the Douglas-Peucker algorithm, keeping each point
+    further than the tolerance from the line through the points either side."""
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    spans = [(0, len(points) - 1)]
+    while spans:
+        first, last = spans.pop()
+        (ax, ay), (bx, by) = points[first], points[last]
+        dx, dy = bx - ax, by - ay
+        length = hypot(dx, dy)
+        index, furthest = None, tolerance
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if length:
+                distance = abs(dx * (py - ay) - dy * (px - ax)) / length
+            else:
+                distance = hypot(px - ax, py - ay)
+            if distance > furthest:
+                index, furthest = i, distance
+        if index is not None:
+            keep[index] = True
+            spans.extend([(first, index), (index, last)])
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def simplify_path(d, tolerance, precision=SIMPLIFIED_PRECISION):
+    """Simplify each ring of path data to a tolerance.
+
+    Rings which would collapse below a triangle are kept as they are,
+    so no area disappears, and path data with curves is returned as it is.
+    """
+    try:
+        rings = path_rings(d)
+    except (KeyError, ValueError, IndexError, AttributeError):
+        return d
+    if rings is None:
+        return d
+
+    output = []
+    for ring in rings:
+        # the ring is simplified as a line from its first point back to it
+        simplified = douglas_peucker(ring + ring[:1], tolerance)[:-1]
+        if len(simplified) < 3:
+            simplified = ring
+
+        # each point is written relative to the rounded point before it
+        rx, ry = (round(value, precision) for value in simplified[0])
+        output.append("M")
+        append_path_number(output, path_number(rx, precision))
+        append_path_number(output, path_number(ry, precision))
+        output.append("l")
+        for x, y in simplified[1:]:
+            x, y = round(x, precision), round(y, precision)
+            append_path_number(output, path_number(x - rx, precision))
+            append_path_number(output, path_number(y - ry, precision))
+            rx, ry = x, y
+        output.append("z")
+    return "".join(output)
+
+
+def simplified_svg(level, path=SHAPES_SVG_PATH, cache_dir=SIMPLIFIED_SVG_DIR):
+    """Get the path of a copy of the LPA shapes simplified to a level of detail.
+
+    Copies are cached by a hash of the shapes, the tolerance, the precision
+    and the version of the simplification, so are only simplified once for
+    each version of the shapes, and again whenever the simplification changes.
+    """
+    tolerance = detail_levels[level]
+    if not tolerance or not os.path.exists(path):
+        return path
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        digest.update(f.read())
+    digest.update(repr((tolerance, SIMPLIFIED_PRECISION, SIMPLIFY_VERSION)).encode())
+    simplified = os.path.join(cache_dir, f"{digest.hexdigest()[:16]}.svg")
+    if not os.path.exists(simplified):
+        print(f"Simplifying {path} to {level} detail...", file=sys.stderr)
+        with open(path) as f:
+            text = f.read()
+        text = re.sub(
+            r'\bd="([^"]*)"',
+            lambda m: f'd="{simplify_path(m.group(1), tolerance)}"',
+            text,
+        )
+        write_file(simplified, text)
+    return simplified
+
+
+def minify_model(svg):
+    """Minify the text of each part of a map model."""
+    svg = dict(svg)
+    for key in ("header", "footer", "asset"):
+        if key in svg:
+            svg[key] = minify_markup(svg[key])
+    if "shapes" in svg:
+        svg["shapes"] = [
+            (
+                minify_markup(part)
+                if isinstance(part, str)
+                else (part[0], minify_markup(part[1]), minify_markup(part[2]))
+            )
+            for part in svg["shapes"]
+        ]
+    if "circles" in svg:
+        svg["circles"] = {
+            lpa: minify_markup(line) for lpa, line in svg["circles"].items()
+        }
+    return svg
+
+
+class Fragments:
+    """Text made of fragments, which are yielded in turn by a function rather
+    than joined into one string, so a template can stream them.
+
+    The key identifies the text for a page fingerprint without building it.
+    """
+
+    def __init__(self, key, function, *args):
+        self.key = key
+        self.function = function
+        self.args = args
+
+    def __iter__(self):
+        fragments = self.function(*self.args)
+        if profiling:
+            return timed_fragments(fragments)
+        return fragments
+
+    def __str__(self):
+        return "".join(self)
+
+    def __repr__(self):
+        return f"Fragments({self.key!r})"
+
+
+def timed_fragments(fragments):
+    """Yield fragments, adding the time taken to make each to the svg profile."""
+    while True:
+        start = time.perf_counter()
+        try:
+            fragment = next(fragments)
+        except StopIteration:
+            return
+        finally:
+            profile_totals["svg"] += time.perf_counter() - start
+        yield fragment
+
+
+def point_fragments(svg, circles):
+    """Yield a points map, with a circle of a radius and class for each award."""
+    yield svg["header"]
+    for lpa, r, intervention in circles:
+        line = svg["circles"][lpa]
+        line = line.replace('r="1"', f'r="{r:.2f}"')
+        yield line.replace('class="point"', f'class="{intervention}"')
+    yield svg["footer"]
+
+
+def shape_fragments(svg, classes):
+    """Yield a shapes map, with the class of each LPA's shape."""
+    yield svg["header"]
+    for part in svg["shapes"]:
+        if isinstance(part, str):
+            yield part
+        else:
+            lpa, head, tail = part
+            yield head
+            yield classes.get(lpa, "")
+            yield tail
+    yield svg["footer"]
+
+
+def process_points_svg(conn, filter_type=None, filter_value=None):
+    """Process point.svg to add award circles.
+
+    Args:
+        conn: Database connection
+        filter_type: Optional filter type ('fund', 'intervention', 'project', 'organisation')
+        filter_value: Optional filter value (e.g., fund ID)
+    """
+    cursor = conn.cursor()
+
+    # Get awards with organisation data, optionally filtered
+    if filter_type == "fund":
+        cursor.execute(
+            """
+            SELECT a.award, a.intervention, a.amount, a.organisation,
+                   o.local_planning_authority, o.entity
+            FROM awards a
+            JOIN organisations o ON a.organisation = o.organisation
+            WHERE a.fund = ?
+            ORDER BY a.rowid
+        """,
+            (filter_value,),
+        )
+    elif filter_type == "intervention":
+        cursor.execute(
+            """
+            SELECT a.award, a.intervention, a.amount, a.organisation,
+                   o.local_planning_authority, o.entity
+            FROM awards a
+            JOIN organisations o ON a.organisation = o.organisation
+            WHERE a.intervention = ?
+            ORDER BY a.rowid
+        """,
+            (filter_value,),
+        )
+    elif filter_type == "project":
+        cursor.execute(
+            """
+            SELECT a.award, a.intervention, a.amount, a.organisation,
+                   o.local_planning_authority, o.entity
+            FROM awards a
+            JOIN organisations o ON a.organisation = o.organisation
+            JOIN project_organisations po ON a.organisation = po.organisation
+            WHERE po.project = ?
+            ORDER BY a.rowid
+        """,
+            (filter_value,),
+        )
+    elif filter_type == "organisation":
+        cursor.execute(
+            """
+            SELECT a.award, a.intervention, a.amount, a.organisation,
+                   o.local_planning_authority, o.entity
+            FROM awards a
+            JOIN organisations o ON a.organisation = o.organisation
+            WHERE a.organisation = ?
+            ORDER BY a.rowid
+        """,
+            (filter_value,),
+        )
+    else:
+        cursor.execute(
+            """
+            SELECT a.award, a.intervention, a.amount, a.organisation,
+                   o.local_planning_authority, o.entity
+            FROM awards a
+            JOIN organisations o ON a.organisation = o.organisation
+            ORDER BY a.rowid
+        """
+        )
+
+    awards_data = cursor.fetchall()
+
+    svg = svg_model("points", conn)
+    if svg is None:
+        return ""
+
+    # Size and class an award circle for each award in an LPA
+    circles = []
+    for award_row in awards_data:
+        org = award_row["organisation"]
+        intervention = award_row["intervention"]
+        amount = award_row["amount"]
+
+        lpa = svg["areas"].get(org)
+        if lpa in svg["circles"]:
+            circles.append((lpa, radius(amount), intervention))
+
+    key = (svg["fingerprint"], circles)
+    return Fragments(key, point_fragments, svg, circles)
+
+
 def process_shapes_svg(conn, filter_type=None, filter_value=None):
     """Process local-planning-authority.svg to add funding colors.
 
@@ -1528,146 +2297,47 @@ def process_shapes_svg(conn, filter_type=None, filter_value=None):
             "name": row["name"],
         }
 
-    # Get ALL organisations with LPA codes for linking all shapes
-    cursor.execute(
-        """
-        SELECT organisation, local_planning_authority, name
-        FROM organisations
-        WHERE local_planning_authority != ''
-        """
-    )
-    all_lpa_orgs = {}
-    for row in cursor.fetchall():
-        all_lpa_orgs[row["local_planning_authority"]] = {
-            "organisation": row["organisation"],
-            "name": row["name"],
-        }
-
-    # Get interventions per organisation to calculate bucket
-    if filter_type == "fund":
-        cursor.execute(
-            """
-            SELECT organisation, intervention
-            FROM awards
-            WHERE fund = ?
-        """,
-            (filter_value,),
-        )
-    elif filter_type == "intervention":
+    # Get the bucket of each organisation's awards within the filter
+    if filter_type in ("fund", "intervention", "project"):
         cursor.execute(
             """
-            SELECT organisation, intervention
-            FROM awards
-            WHERE intervention = ?
+            SELECT organisation, bucket
+            FROM organisation_buckets
+            WHERE scope = ? AND scope_value = ?
         """,
-            (filter_value,),
-        )
-    elif filter_type == "project":
-        cursor.execute(
-            """
-            SELECT a.organisation, a.intervention
-            FROM awards a
-            JOIN project_organisations po ON a.organisation = po.organisation
-            WHERE po.project = ?
-        """,
-            (filter_value,),
+            (filter_type, filter_value),
         )
     elif filter_type == "organisation":
         cursor.execute(
             """
-            SELECT organisation, intervention
-            FROM awards
-            WHERE organisation = ?
+            SELECT organisation, bucket
+            FROM organisation_buckets
+            WHERE scope = 'all' AND scope_value = '' AND organisation = ?
         """,
             (filter_value,),
         )
     else:
         cursor.execute(
             """
-            SELECT organisation, intervention
-            FROM awards
+            SELECT organisation, bucket
+            FROM organisation_buckets
+            WHERE scope = 'all' AND scope_value = ''
         """
         )
 
-    org_interventions = {}
-    for row in cursor.fetchall():
-        org = row["organisation"]
-        org_interventions.setdefault(org, set())
-        org_interventions[org].add(row["intervention"])
-
-    # Calculate bucket for each organisation
-    org_buckets = {}
-    for org, interventions in org_interventions.items():
-        buckets = set()
-        if interventions & set(["innovation", "engagement"]):
-            buckets.add("PropTech")
-        if interventions & set(["software", "integration", "improvement"]):
-            buckets.add("Software")
-        if interventions & set(["plan-making", "local-plan-pathfinders", "local-plan-delivery", "green-belt-reviews"]):
-            buckets.add("Plan-making")
-        org_buckets[org] = "_".join(sorted(list(buckets)))
-
-    svg_path = "var/cache/local-planning-authority.svg"
-    if not os.path.exists(svg_path):
-        return ""
-
-    re_id = re.compile(r"id=\"(?P<lpa>\w+)")
-    found = set()
-    current_class = ""
-    current_lpa = ""
-    current_name = ""
+    org_buckets = {row["organisation"]: row["bucket"] for row in cursor.fetchall()}
 
-    output = []
-    with open(svg_path) as f:
-        for line in f.readlines():
-            if "<svg" in line:
-                line = line.replace("455", "465")
-            line = line.replace(' fill-rule="evenodd"', "")
-            line = line.replace('class="polygon ', 'class="')
-
-            match = re_id.search(line)
-            if match:
-                lpa = match.group("lpa")
-                if lpa in found:
-                    print(f"already found {lpa}", file=sys.stderr)
-                if lpa not in all_lpa_orgs:
-                    current_class = ""
-                    current_lpa = ""
-                    current_name = ""
-                else:
-                    found.add(lpa)
-                    current_lpa = lpa
-                    current_name = all_lpa_orgs[lpa]["name"]
-                    # Only set class if this org has funding
-                    if lpa in lpa_orgs:
-                        organisation = lpa_orgs[lpa]["organisation"]
-                        current_class = org_buckets.get(organisation, "")
-                    else:
-                        current_class = ""
+    svg = svg_model("shapes", conn, map_detail[filter_type])
+    if svg is None:
+        return ""
 
-            if 'class="local-planning-authority"' in line:
-                # Only add link if we have a valid organisation
-                if current_lpa and current_lpa in all_lpa_orgs:
-                    org_link = (
-                        f"/organisation/{all_lpa_orgs[current_lpa]['organisation']}/"
-                    )
-                    line = line.replace(
-                        "<path", f'<a href="{BASE_PATH}{org_link}"><path'
-                    )
-                    line = line.replace(
-                        'class="local-planning-authority"/>',
-                        f'class="local-planning-authority {current_class}"><title>{current_name}</title></path></a>',
-                    )
-                else:
-                    # No link for areas not in database
-                    line = line.replace(
-                        'class="local-planning-authority"/>',
-                        f'class="local-planning-authority {current_class}"><title>{current_name}</title></path>',
-                    )
+    # Only set class if this org has funding
+    classes = {
+        lpa: org_buckets.get(row["organisation"], "") for lpa, row in lpa_orgs.items()
+    }
 
-            output.append(line)
-
-    return "".join(output)
+    key = (svg["fingerprint"], sorted(classes.items()))
+    return Fragments(key, shape_fragments, svg, classes)
 
 
 def render_awards(env, conn):
@@ -1686,30 +2356,33 @@ def render_awards(env, conn):
         JOIN organisations o ON a.organisation = o.organisation
         JOIN interventions i ON a.intervention = i.intervention
         JOIN funds f ON a.fund = f.fund
-        ORDER BY a.start_date ASC
+        ORDER BY a.start_date ASC, a.rowid
+    """
+    )
+
+    award_rows = cursor.fetchall()
+
+    # Get partner organisations for every award
+    cursor.execute(
+        """
+        SELECT ao.award, o.organisation, o.name
+        FROM award_organisations ao
+        JOIN organisations o ON ao.organisation = o.organisation
+        WHERE ao.role = 'partner'
+        ORDER BY ao.award, o.organisation
     """
     )
+    award_partners = group_rows(cursor, "award")
 
     awards = []
-    for row in cursor.fetchall():
+    for row in award_rows:
         # Format partners
-        partners_html = ""
-        if row["organisations"]:
-            partner_orgs = [p for p in row["organisations"].split(";") if p]
-            cursor.execute(
-                """
-                SELECT organisation, name FROM organisations WHERE organisation IN ({})
-            """.format(
-                    ",".join(["?"] * len(partner_orgs))
-                ),
-                partner_orgs,
-            )
-            partners_html = ", ".join(
-                [
-                    f'<a href="{BASE_PATH}organisation/{r["organisation"]}/">{escape(r["name"])}</a>'
-                    for r in cursor.fetchall()
-                ]
-            )
+        partners_html = ", ".join(
+            [
+                f'<a href="{BASE_PATH}organisation/{r["organisation"]}/">{escape(r["name"])}</a>'
+                for r in award_partners.get(row["award"], [])
+            ]
+        )
 
         awards.append(
             {
@@ -1731,31 +2404,18 @@ def render_awards(env, conn):
     # Calculate counts for stacked chart
     counts = {item["reference"]: 0 for item in AWARD_LEGENDS}
 
-    # Get organisation buckets
+    # Count organisations in each bucket
     cursor.execute(
         """
-        SELECT organisation, intervention
-        FROM awards
+        SELECT bucket, COUNT(*) AS count
+        FROM organisation_buckets
+        WHERE scope = 'all' AND scope_value = ''
+        GROUP BY bucket
     """
     )
-
-    org_interventions = {}
     for row in cursor.fetchall():
-        org = row["organisation"]
-        org_interventions.setdefault(org, set())
-        org_interventions[org].add(row["intervention"])
-
-    for org, interventions in org_interventions.items():
-        buckets = set()
-        if interventions & set(["innovation", "engagement"]):
-            buckets.add("PropTech")
-        if interventions & set(["software", "integration", "improvement"]):
-            buckets.add("Software")
-        if interventions & set(["plan-making", "local-plan-pathfinders", "local-plan-delivery", "green-belt-reviews"]):
-            buckets.add("Plan-making")
-        bucket_key = "_".join(sorted(list(buckets)))
-        if bucket_key in counts:
-            counts[bucket_key] += 1
+        if row["bucket"] in counts:
+            counts[row["bucket"]] = row["count"]
 
     # Process SVG maps
     shapes_svg = process_shapes_svg(conn)
@@ -1783,36 +2443,262 @@ def render_awards(env, conn):
     )
 
 
+# Render functions for each section, with those rendering a page
+# for each organisation, project, etc. able to be split into shards
+SECTIONS = [
+    ("render_index", False),
+    ("render_adoption_redirect", False),
+    ("render_awards", False),
+    ("render_intervention_index", False),
+    ("render_interventions", True),
+    ("render_fund_index", False),
+    ("render_funds", True),
+    ("render_organisation_index", False),
+    ("render_organisations", True),
+    ("render_project_index", False),
+    ("render_projects", True),
+    ("render_product_index", False),
+    ("render_products", True),
+]
+
+# Database connection and template environment for a worker process
+worker = {}
+
+
+def render_section(name, env, conn, shard=None):
+    """Render a section, or a shard of a section, adding it to the profile."""
+    start = profile_snapshot()
+    profile_page_start.update(start)
+
+    function = globals()[name]
+    if shard is None:
+        function(env, conn)
+    else:
+        function(env, conn, shard)
+
+    if profiling:
+        profile_add(profile["functions"], name, profile_since(start))
+
+
+def init_worker(maps, minified, manifest, profile_pages):
+    """Open a read-only connection and template environment for a worker."""
+    global shared_maps, minify, profiling
+    shared_maps = maps
+    minify = minified
+    profiling = profile_pages
+    previous_fingerprints.update(manifest)
+    worker["conn"] = get_db_connection(read_only=True)
+    worker["env"] = get_environment()
+
+
+def render_task(task):
+    """Render a section, or a shard of a section, in a worker.
+
+    Returns the fingerprints, page counts and profile of the pages rendered.
+    """
+    name, shard = task
+    fingerprints.clear()
+    page_counts.update(written=0, unchanged=0, skipped=0)
+    profile["functions"].clear()
+    profile["pages"].clear()
+
+    render_section(name, worker["env"], worker["conn"], shard)
+
+    return dict(fingerprints), dict(page_counts), json.loads(json.dumps(profile))
+
+
+def render_parallel(jobs):
+    """Render every section across a pool of worker processes."""
+    tasks = []
+    for name, shardable in SECTIONS:
+        if shardable:
+            tasks.extend((name, (index, jobs)) for index in range(jobs))
+        else:
+            tasks.append((name, None))
+
+    initargs = (shared_maps, minify, previous_fingerprints, profiling)
+    with multiprocessing.Pool(jobs, init_worker, initargs) as pool:
+        for result in pool.imap_unordered(render_task, tasks):
+            task_fingerprints, task_page_counts, task_profile = result
+            fingerprints.update(task_fingerprints)
+            for key, value in task_page_counts.items():
+                page_counts[key] += value
+            for kind, profiles in task_profile.items():
+                for key, metrics in profiles.items():
+                    profile_add(profile[kind], key, metrics)
+
+
+def compress_file(path):
+    """Write each compressed copy of a file which is older than the file.
+
+    Returns the number of copies written.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    data = None
+    written = 0
+    for suffix, compress in compressors.items():
+        target = path + suffix
+        if os.path.exists(target) and os.stat(target).st_mtime_ns >= mtime:
+            continue
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(compress(data))
+        os.replace(tmp, target)
+        written += 1
+    return written
+
+
+def compress_docs(docs="docs/", jobs=1):
+    """Write compressed copies of the pages and assets which have changed,
+    and remove the copies of any which no longer exist."""
+    if brotli is None:
+        print(
+            "Warning: brotli isn't installed, so no .br copies will be written, "
+            "run make init to install it",
+            file=sys.stderr,
+        )
+
+    paths = []
+    removed = 0
+    for directory, _, names in os.walk(docs):
+        for name in names:
+            path = os.path.join(directory, name)
+            if name.endswith(COMPRESS_EXTENSIONS):
+                paths.append(path)
+            elif name.endswith(COMPRESSED_SUFFIXES):
+                source, _ = os.path.splitext(path)
+                if source.endswith(COMPRESS_EXTENSIONS) and not os.path.exists(source):
+                    os.remove(path)
+                    removed += 1
+
+    if jobs > 1:
+        with multiprocessing.Pool(jobs) as pool:
+            written = sum(pool.imap_unordered(compress_file, paths, chunksize=16))
+    else:
+        written = sum(map(compress_file, paths))
+    print(f"{written} compressed files written, {removed} removed", file=sys.stderr)
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Load the page fingerprints saved by the last run."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Save the page fingerprints for the next run."""
+    write_file(path, json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def report_profile(path=PROFILE_PATH, limit=20):
+    """Print the render functions and slowest pages by time, and save the profile."""
+    headings = (
+        f"{'wall':>9} {'sql':>9} {'stmts':>7} {'template':>9} {'svg':>9} {'bytes':>11}"
+    )
+
+    def line(name, metrics):
+        return (
+            f"{metrics['wall']:9.3f} {metrics['sql']:9.3f} {metrics['statements']:7d} "
+            f"{metrics['template']:9.3f} {metrics['svg']:9.3f} {metrics['bytes']:11,d}  {name}"
+        )
+
+    for kind, title, count in [
+        ("functions", "render function", None),
+        ("pages", "page", limit),
+    ]:
+        entries = sorted(
+            profile[kind].items(), key=lambda item: item[1]["wall"], reverse=True
+        )
+        print(f"\n{headings}  {title}", file=sys.stderr)
+        for name, metrics in entries[:count]:
+            print(line(name, metrics), file=sys.stderr)
+
+    write_file(path, json.dumps(profile, indent=2, sort_keys=True))
+    print(f"\nprofile saved to {path}", file=sys.stderr)
+
+
 def main():
     """Main entry point."""
+    global shared_maps, minify, profiling
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--shared-maps",
+        action="store_true",
+        help="reference the LPA map geometry from docs/map/ instead of inlining it in each page",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="render pages across this number of worker processes",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="render every page, even those whose inputs are unchanged",
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="strip whitespace, round map coordinates and share static style blocks as stylesheets",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="write .gz and .br copies of each changed page and asset",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=PROFILE_PATH,
+        metavar="PATH",
+        help=f"report the time spent on each render function and page, saving it as JSON (default {PROFILE_PATH})",
+    )
+    args = parser.parse_args()
+    shared_maps = args.shared_maps
+    minify = args.minify
+    profiling = args.profile is not None
+
     if not os.path.exists(DATABASE_PATH):
         print(f"Error: Database not found at {DATABASE_PATH}", file=sys.stderr)
         print("Please run 'make dataset/performance.sqlite3' first", file=sys.stderr)
         sys.exit(1)
 
     conn = get_db_connection()
-    env = Environment(loader=FileSystemLoader("templates/"))
+    env = get_environment()
 
-    # Add custom filters
-    env.filters["urlencode"] = lambda s: quote(str(s), safe="")
-    env.filters["slugify"] = lambda s: str(s).replace("/", "-")
-    env.filters["govuk_date"] = lambda s: format_govuk_date(s)
+    if not args.force:
+        previous_fingerprints.update(load_manifest())
 
     try:
         print("Rendering pages...", file=sys.stderr)
-        render_index(env, conn)
-        render_adoption_redirect(env, conn)
-        render_awards(env, conn)
-        render_intervention_index(env, conn)
-        render_interventions(env, conn)
-        render_fund_index(env, conn)
-        render_funds(env, conn)
-        render_organisation_index(env, conn)
-        render_organisations(env, conn)
-        render_project_index(env, conn)
-        render_projects(env, conn)
-        render_product_index(env, conn)
-        render_products(env, conn)
+        if minify:
+            write_stylesheets(env)
+        if shared_maps:
+            write_shared_maps(conn)
+        if args.jobs > 1:
+            render_parallel(args.jobs)
+        else:
+            for name, shardable in SECTIONS:
+                render_section(name, env, conn)
+        save_manifest(fingerprints)
+        if args.compress:
+            compress_docs(jobs=args.jobs)
+        print(
+            f"{page_counts['written']} pages written, "
+            f"{page_counts['unchanged']} unchanged, "
+            f"{page_counts['skipped']} skipped with unchanged inputs",
+            file=sys.stderr,
+        )
+        if profiling:
+            report_profile(args.profile)
         print("All pages rendered successfully!", file=sys.stderr)
     except Exception as e:
         print(f"Error rendering pages: {e}", file=sys.stderr)
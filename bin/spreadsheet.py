@@ -0,0 +1,149 @@
+"""
+Read spreadsheets, such as the ODS planning application statistics tables.
+
+Parsing an ODS file is slow, so the cells of each sheet are cached in a
+typed CSV file named by the hash of the spreadsheet, and read from there
+until the spreadsheet changes.
+"""
+
+import os
+import csv
+import hashlib
+from datetime import time
+
+import pandas as pd
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+CACHE_DIR = "var/cache/sheets/"
+ORGANISATION_PATH = "var/cache/organisation.csv"
+
+# References used by the statistics tables which aren't in the organisation dataset
+patched_references = {
+    # patched for now ..
+    "E51000005": "development-corporation:Q115585981",
+    "E51000006": "development-corporation:Q117149370",
+    "E51000007": "development-corporation:Q124604981",
+    "E26000008": "national-park-authority:Q27178932",
+    "E26000011": "national-park-authority:Q27159704",
+    "E26000012": "national-park-authority:Q27178932",
+}
+
+# Organisation dataset fields with the references used by the statistics tables
+reference_fields = [
+    "local-authority-district",
+    "local-planning-authority",
+    "statistical-geography",
+]
+
+# Cell types, by the prefix used for each in the cache
+decoders = {
+    "s": str,
+    "i": int,
+    "f": float,
+    "b": lambda value: value == "True",
+    "d": pd.Timestamp,
+    "t": time.fromisoformat,
+}
+
+
+def file_hash(path):
+    """Hash the contents of a file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def encode(value):
+    """Encode a cell as its type prefix and value."""
+    if value == "" or value is None:
+        return ""
+    if isinstance(value, bool):
+        return f"b{value}"
+    if isinstance(value, int):
+        return f"i{value}"
+    if isinstance(value, float):
+        return f"f{value!r}"
+    if isinstance(value, pd.Timestamp):
+        return f"d{value.isoformat()}"
+    if isinstance(value, time):
+        return f"t{value.isoformat()}"
+    return f"s{value}"
+
+
+def decode(token):
+    """Decode a cell from its type prefix and value."""
+    if not token:
+        return ""
+    return decoders[token[0]](token[1:])
+
+
+def parse_sheets(path):
+    """Parse the cells of every sheet in a spreadsheet, as lists of rows."""
+    sheets = pd.read_excel(
+        path, sheet_name=None, header=None, dtype=object, na_filter=False
+    )
+    return {name: df.values.tolist() for name, df in sheets.items()}
+
+
+def save_sheets(path, sheets):
+    """Save the cells of each sheet to a typed CSV file, one row per line."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.writer(f)
+        for name, rows in sheets.items():
+            if not rows:
+                writer.writerow([name])
+            for row in rows:
+                writer.writerow([name] + [encode(value) for value in row])
+    os.replace(tmp, path)
+
+
+def load_sheets(path):
+    """Load the cells of each sheet from a typed CSV file."""
+    sheets = {}
+    with open(path, newline="") as f:
+        for name, *row in csv.reader(f):
+            rows = sheets.setdefault(name, [])
+            if row:
+                rows.append([decode(token) for token in row])
+    return sheets
+
+
+def read_sheets(path, cache_dir=CACHE_DIR):
+    """Read the cells of every sheet in a spreadsheet, from the cache if possible."""
+    cache = os.path.join(cache_dir, f"{file_hash(path)}.csv")
+    if os.path.exists(cache):
+        return load_sheets(cache)
+
+    sheets = parse_sheets(path)
+    save_sheets(cache, sheets)
+    return sheets
+
+
+def read_table(rows, skiprows=0, skipfooter=0):
+    """Read a table from the rows of a sheet, as pandas.read_excel does."""
+    try:
+        return TextParser(
+            rows,
+            header=0,
+            skiprows=skiprows,
+            skipfooter=skipfooter,
+            skip_blank_lines=False,
+        ).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+
+def organisation_references(path=ORGANISATION_PATH):
+    """Map the references used by the statistics tables to organisations."""
+    organisations = dict(patched_references)
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            for field in reference_fields:
+                if row.get(field, ""):
+                    organisations[row[field]] = row["organisation"]
+    return organisations